@@ -10,13 +10,31 @@ import asyncio
 import json
 import logging
 import re
+import time
+from bisect import bisect_right
 from datetime import datetime, timedelta
+from operator import itemgetter
 from typing import Dict, List, Optional, Set, Tuple
 
 import aiohttp
 
+# ⚡ orjson أسرع بكتير في فك الـ batch الكبير - اختياري
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+except ImportError:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
+
 from config import (
+    BURST_CACHE_TTL,
     BURST_MODE_DURATION,
+    CACHE_TTL_AGE_FACTOR,
     CACHE_TTL_MAX,
     CACHE_TTL_MIN,
     CACHE_TTL_NORMAL,
@@ -27,6 +45,81 @@ from stats import stats  # ✅ استيراد من ملف منفصل
 
 logger = logging.getLogger(__name__)
 
+# bytes عشان ما نفكش ترميز صفحة الـ HTML كلها
+_CSRF_RE = re.compile(rb'<meta name="csrf-token" content="([^"]+)"')
+
+# الأعمدة اللي بنستخدمها من رد updateSenderPage (الاسم → index في الصف)
+# ⚡ image (1) و backupCodes (9) مش بنقراهم خالص فمش بنبنيهم
+_ACCOUNT_COLUMNS = (
+    ("idAccount", 0),
+    ("Sender", 2),
+    ("Start", 3),
+    ("Last Update", 4),
+    ("Taken", 5),
+    ("Status", 6),
+    ("Available", 7),
+    ("password", 8),
+    ("Group", 10),
+    ("groupNameId", 11),
+    ("Take", 12),
+    ("Keep", 13),
+)
+_ACCOUNT_KEYS = tuple(key for key, _ in _ACCOUNT_COLUMNS)
+_ACCOUNT_INDEXES = tuple(idx for _, idx in _ACCOUNT_COLUMNS)
+_ACCOUNT_ROW_WIDTH = max(_ACCOUNT_INDEXES) + 1
+_pick_account_fields = itemgetter(*_ACCOUNT_INDEXES)
+_SENDER_INDEX = 2
+
+# ⚙️ فوق العدد ده من الصفوف، التحليل وبناء الفهارس بيتم في thread
+_EXECUTOR_PARSE_THRESHOLD = 200
+
+# 🎯 جدول الـ TTL حسب عدد التغييرات: <2 → هدوء، 2-4 → عادي، ≥5 → نشاط عالي
+_TTL_THRESHOLDS = (2, 5)
+_TTL_BY_ACTIVITY = (None, CACHE_TTL_NORMAL, CACHE_TTL_MIN)
+_QUIET_CYCLES_FOR_LONG_TTL = 3
+
+
+def _parse_account_row(row: List) -> Dict:
+    """تحويل صف من الرد لـ dict (القيم الفاضية أو الناقصة → "")"""
+    # الصفوف الكاملة هي الغالبية - الـ padding بس للصفوف الناقصة
+    if len(row) >= _ACCOUNT_ROW_WIDTH:
+        values = _pick_account_fields(row)
+    else:
+        width = len(row)
+        values = [row[idx] if idx < width else "" for idx in _ACCOUNT_INDEXES]
+    return {
+        key: str(value) if value else "" for key, value in zip(_ACCOUNT_KEYS, values)
+    }
+
+
+def _norm_email(email: str) -> str:
+    """توحيد شكل الإيميل للبحث (strip + lower - أرخص من lookup في كاش)"""
+    return email.strip().lower()
+
+
+def _build_indexes(accounts: List[Dict]) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+    """بناء فهارس الـ ID والإيميل (أول تطابق هو اللي يكسب زي البحث الخطي)"""
+    by_id: Dict[str, Dict] = {}
+    by_email: Dict[str, Dict] = {}
+
+    for account in accounts:
+        by_id.setdefault(str(account.get("idAccount", "")), account)
+        sender = account.get("Sender", "")
+        if sender:
+            by_email.setdefault(sender.strip().lower(), account)
+
+    return by_id, by_email
+
+
+def _parse_and_index(
+    rows: List[List],
+) -> Tuple[List[Dict], Dict[str, Dict], Dict[str, Dict]]:
+    """تحليل صفوف الـ batch + بناء الفهارس (دالة pure تنفع تشتغل في thread)"""
+    parsed = [_parse_account_row(row) for row in rows if len(row) > _SENDER_INDEX]
+    by_id, by_email = _build_indexes(parsed)
+    return parsed, by_id, by_email
+
+
 # ═══════════════════════════════════════════════════════════════
 # 🧠 Smart Cache Manager (النسخة الهجينة النهائية - الأفضل)
 # ═══════════════════════════════════════════════════════════════
@@ -41,46 +134,95 @@ class SmartCacheManager:
     - Fallback mechanism
     """
 
+    __slots__ = (
+        "cache",
+        "cache_timestamp",
+        "_cache_mono",
+        "cache_ttl",
+        "burst_targets",
+        "burst_window_start",
+        "last_changes_count",
+        "consecutive_quiet_cycles",
+        "_last_mod_mono",
+        "last_successful_cache",
+        "last_successful_timestamp",
+        "_last_successful_mono",
+        "_by_id",
+        "_by_email",
+        "_pending_emails",
+        "_burst_view",
+    )
+
     def __init__(self):
         self.cache: Optional[List[Dict]] = None
-        self.cache_timestamp: Optional[datetime] = None
+        self.cache_timestamp: Optional[datetime] = None  # للعرض فقط
+        self._cache_mono: float = 0.0  # time.monotonic() لحساب العمر
         self.cache_ttl: float = CACHE_TTL_NORMAL
 
         # ✅ نظام Burst Mode المحسّن
         self.burst_targets: Set[str] = set()  # قائمة IDs الحسابات النشطة
-        self.burst_window_start: Optional[datetime] = None  # بداية النافذة الزمنية
+        self.burst_window_start: Optional[float] = None  # بداية النافذة (monotonic)
+        self._burst_view: Dict[str, Dict] = {}  # ID → صف الحساب للأهداف بس
 
         # Activity tracking for Smart TTL
         self.last_changes_count: int = 0
         self.consecutive_quiet_cycles: int = 0
+        self._last_mod_mono: float = time.monotonic()  # آخر تغيير فعلي في القائمة
 
         # Fallback
         self.last_successful_cache: Optional[List[Dict]] = None
         self.last_successful_timestamp: Optional[datetime] = None
+        self._last_successful_mono: float = 0.0
+
+        # ✅ فهارس O(1) للبحث بالـ ID والإيميل (تتبني مع كل تحديث ناجح)
+        self._by_id: Dict[str, Dict] = {}
+        self._by_email: Dict[str, Dict] = {}
+
+        # إيميلات اتضافت محلياً ولسه السيرفر ما رجعش الصف بتاعها (بدون ID)
+        self._pending_emails: Set[str] = set()
 
     def is_cache_valid(self) -> bool:
-        """✅ التحقق الذكي: طالما فيه أهداف، الكاش غير صالح"""
-        if self.cache is None or self.cache_timestamp is None:
+        """
+        ✅ التحقق الذكي بمستويين من الـ TTL:
+        - فيه أهداف Burst → TTL قصير جداً (BURST_CACHE_TTL)
+        - مافيش → الـ Smart TTL العادي
+        """
+        if self.cache is None:
             return False
 
+        age = time.monotonic() - self._cache_mono
+
+        # الحالة الغالبة: مافيش Burst
+        if not self.burst_targets:
+            return age < self.cache_ttl
+
         # ✅ لو فيه حسابات في قائمة الانتظار، نحدّث باستمرار
-        if self.burst_targets:
-            return False
+        # (بس كل المراقبين المتزامنين يشاركوا نفس الجلبة)
+        return age < BURST_CACHE_TTL
 
-        age = (datetime.now() - self.cache_timestamp).total_seconds()
-        return age < self.cache_ttl
+    def cache_age(self) -> float:
+        """عمر آخر batch بالثواني (inf لو مافيش cache)"""
+        if self.cache is None:
+            return float("inf")
+        return time.monotonic() - self._cache_mono
+
+    @property
+    def burst_mode_active(self) -> bool:
+        """هل فيه أهداف Burst حالياً؟"""
+        return bool(self.burst_targets)
 
     def activate_burst_mode(self, account_id: str):
         """✅ تفعيل Burst لحساب معين (مع تتبع البداية)"""
-        global stats
-
         # لو دي أول إضافة، سجّل البداية
         if not self.burst_targets:
-            self.burst_window_start = datetime.now()
+            self.burst_window_start = time.monotonic()
             stats.burst_activations += 1
             logger.info(f"🚀 BURST MODE ACTIVATED (first target: {account_id})")
 
         self.burst_targets.add(account_id)
+        account = self._by_id.get(str(account_id))
+        if account is not None:
+            self._burst_view[account_id] = account
         logger.info(
             f"🎯 Added {account_id} to burst targets. Total: {len(self.burst_targets)}"
         )
@@ -89,6 +231,7 @@ class SmartCacheManager:
         """✅ إزالة حساب من قائمة الـ Burst (إزالة فردية)"""
         if account_id in self.burst_targets:
             self.burst_targets.discard(account_id)
+            self._burst_view.pop(account_id, None)
             logger.info(
                 f"✅ Deactivated burst for {account_id}. Remaining: {len(self.burst_targets)}"
             )
@@ -103,7 +246,7 @@ class SmartCacheManager:
         if not self.burst_targets or not self.burst_window_start:
             return
 
-        elapsed = (datetime.now() - self.burst_window_start).total_seconds()
+        elapsed = time.monotonic() - self.burst_window_start
 
         if elapsed >= BURST_MODE_DURATION:
             # ⚠️ Timeout - امسح كل القائمة
@@ -111,8 +254,13 @@ class SmartCacheManager:
                 f"⏱️ BURST MODE TIMEOUT after {elapsed:.1f}s - clearing {len(self.burst_targets)} targets"
             )
             self.burst_targets.clear()
+            self._burst_view.clear()
             self.burst_window_start = None
 
+    def get_burst_accounts(self) -> List[Dict]:
+        """صفوف حسابات الـ Burst بس (بدون المرور على الكاش كله)"""
+        return list(self._burst_view.values())
+
     def adjust_ttl(self, changes_detected: int):
         """
         تعديل ذكي لـ TTL بناءً على النشاط
@@ -120,27 +268,25 @@ class SmartCacheManager:
         - كثير تغييرات → TTL قصير (استجابة أسرع)
         - قليل تغييرات → TTL طويل (توفير موارد)
         """
-        global stats
-
         old_ttl = self.cache_ttl
+        new_ttl = _TTL_BY_ACTIVITY[bisect_right(_TTL_THRESHOLDS, changes_detected)]
 
-        if changes_detected >= 5:
-            # نشاط عالي جداً
-            self.cache_ttl = CACHE_TTL_MIN
+        if new_ttl is not None:
+            # نشاط متوسط أو عالي
+            self.cache_ttl = new_ttl
             self.consecutive_quiet_cycles = 0
-
-        elif changes_detected >= 2:
-            # نشاط متوسط
-            self.cache_ttl = CACHE_TTL_NORMAL
-            self.consecutive_quiet_cycles = 0
-
         else:
-            # هدوء
+            # هدوء - بعد 3 دورات هادئة متتالية: TTL = α × (الوقت من آخر تعديل)
+            # كل ما القائمة تفضل ثابتة أكتر، نطول الفترة لحد CACHE_TTL_MAX
             self.consecutive_quiet_cycles += 1
-
-            if self.consecutive_quiet_cycles >= 3:
-                # 3 دورات هادئة متتالية → نطول الفترة
-                self.cache_ttl = CACHE_TTL_MAX
+            if self.consecutive_quiet_cycles >= _QUIET_CYCLES_FOR_LONG_TTL:
+                since_mod = time.monotonic() - self._last_mod_mono
+                self.cache_ttl = round(
+                    min(
+                        CACHE_TTL_MAX,
+                        max(CACHE_TTL_MIN, CACHE_TTL_AGE_FACTOR * since_mod),
+                    )
+                )
 
         if old_ttl != self.cache_ttl:
             stats.adaptive_adjustments += 1
@@ -148,19 +294,72 @@ class SmartCacheManager:
                 f"🎯 TTL adjusted: {old_ttl:.0f}s → {self.cache_ttl:.0f}s (changes={changes_detected})"
             )
 
-    def update_cache(self, new_data: List[Dict], success: bool = True):
-        """تحديث الـ cache مع fallback mechanism"""
+    def update_cache(
+        self,
+        new_data: List[Dict],
+        success: bool = True,
+        indexes: Optional[Tuple[Dict[str, Dict], Dict[str, Dict]]] = None,
+    ):
+        """
+        تحديث الـ cache مع fallback mechanism
+
+        Args:
+            indexes: (by_id, by_email) لو اتبنوا بره (مثلاً في thread)
+        """
         if success:
+            now = datetime.now()
+            now_mono = time.monotonic()
+            if new_data != self.last_successful_cache:
+                self._last_mod_mono = now_mono
             self.cache = new_data
-            self.cache_timestamp = datetime.now()
+            self.cache_timestamp = now
+            self._cache_mono = now_mono
             self.last_successful_cache = new_data
-            self.last_successful_timestamp = datetime.now()
+            self.last_successful_timestamp = now
+            self._last_successful_mono = now_mono
+            self._by_id, self._by_email = indexes or _build_indexes(new_data)
+            self._pending_emails = set()
+            if self.burst_targets:
+                self._refresh_burst_view()
         else:
             # فشل التحديث - نستخدم آخر نسخة ناجحة
+            # (الفهارس لسه مبنية على آخر نسخة ناجحة)
             logger.warning("⚠️ Cache update failed, using last successful cache")
             if self.last_successful_cache:
                 self.cache = self.last_successful_cache
                 self.cache_timestamp = self.last_successful_timestamp
+                self._cache_mono = self._last_successful_mono
+
+    def _refresh_burst_view(self):
+        """ربط أهداف الـ Burst بالصفوف الجديدة بعد كل تحديث"""
+        by_id = self._by_id
+        self._burst_view = {
+            account_id: account
+            for account_id in self.burst_targets
+            if (account := by_id.get(str(account_id))) is not None
+        }
+
+    def add_pending(self, email: str):
+        """
+        ➕ إضافة صف مؤقت لحساب لسه متضاف (بدل إلغاء الكاش كله)
+
+        الصف الحقيقي من السيرفر بيحل محله في أول batch fetch
+        """
+        if self.cache is None:
+            return
+
+        email = _norm_email(email)
+        stub = dict.fromkeys(_ACCOUNT_KEYS, "")
+        stub["Sender"] = email
+        stub["Status"] = "LOGGING"
+
+        self.cache.append(stub)
+        self._by_email[email] = stub
+        self._pending_emails.add(email)
+
+    def is_pending(self, email: str) -> bool:
+        """هل الإيميل ده لسه صف مؤقت مستني بيانات السيرفر؟"""
+        return _norm_email(email) in self._pending_emails
 
     def get_cache(self) -> Optional[List[Dict]]:
         """الحصول على الـ cache"""
@@ -173,23 +372,14 @@ class SmartCacheManager:
         if not self.cache:
             return None
 
-        for account in self.cache:
-            if str(account.get("idAccount", "")) == str(account_id):
-                return account
-
-        return None
+        return self._by_id.get(str(account_id))
 
     def get_account_by_email(self, email: str) -> Optional[Dict]:
         """البحث بالإيميل (للبحث الأولي)"""
         if not self.cache:
             return None
 
-        email = email.lower().strip()
-        for account in self.cache:
-            if account.get("Sender", "").lower() == email:
-                return account
-
-        return None
+        return self._by_email.get(_norm_email(email))
 
 
 # Global smart cache
@@ -204,6 +394,19 @@ smart_cache = SmartCacheManager()
 class OptimizedAPIManager:
     """API manager with smart cache integration"""
 
+    __slots__ = (
+        "base_url",
+        "cookies",
+        "defaults",
+        "csrf_token",
+        "csrf_expires_at",
+        "_csrf_valid_until",
+        "_csrf_lock",
+        "_fetch_lock",
+        "_fetch_generation",
+        "session",
+    )
+
     def __init__(self, config: Dict):
         self.base_url = config["website"]["urls"]["base"]
         self.cookies = config["website"]["cookies"]
@@ -211,7 +414,13 @@ class OptimizedAPIManager:
 
         # CSRF Token cache
         self.csrf_token = None
-        self.csrf_expires_at = None
+        self.csrf_expires_at = None  # datetime للعرض في /status
+        self._csrf_valid_until: float = 0.0
+
+        # 🔒 منع الـ thundering herd: طلب واحد بس على الشبكة في نفس الوقت
+        self._csrf_lock = asyncio.Lock()
+        self._fetch_lock = asyncio.Lock()
+        self._fetch_generation: int = 0  # يزيد مع كل batch ناجح
 
         # aiohttp session
         self.session = None
@@ -224,22 +433,48 @@ class OptimizedAPIManager:
     async def _ensure_session(self):
         """Ensure aiohttp session exists"""
         if self.session is None or self.session.closed:
-            connector = aiohttp.TCPConnector(limit=10, limit_per_host=5)
+            # ✅ keepalive أطول من فاصل الـ Burst (2.5s) عشان ما نعيدش TLS handshake
+            connector = aiohttp.TCPConnector(
+                limit=20,
+                limit_per_host=10,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True,
+                ttl_dns_cache=300,
+            )
             timeout = aiohttp.ClientTimeout(total=30)
 
             self.session = aiohttp.ClientSession(
-                connector=connector, timeout=timeout, cookies=self.cookies
+                connector=connector,
+                timeout=timeout,
+                cookies=self.cookies,
+                json_serialize=_json_dumps,
             )
 
     async def get_csrf_token(self, force_refresh: bool = False) -> Optional[str]:
         """Get CSRF token with caching"""
-        global stats
-
-        if not force_refresh and self.csrf_token and self.csrf_expires_at:
-            if datetime.now() < self.csrf_expires_at:
-                stats.cache_hits += 1  # ✅ رجعنا التتبع
-                return self.csrf_token
-
+        # ⚡ المسار السريع: توكن موجود ولسه صالح
+        if (
+            not force_refresh
+            and (token := self.csrf_token)
+            and self._csrf_valid_until > time.monotonic()
+        ):
+            stats.cache_hits += 1  # ✅ رجعنا التتبع
+            return token
+
+        async with self._csrf_lock:
+            # حد تاني جدد التوكن واحنا مستنيين القفل
+            if (
+                not force_refresh
+                and (token := self.csrf_token)
+                and self._csrf_valid_until > time.monotonic()
+            ):
+                stats.cache_hits += 1
+                return token
+
+            return await self._refresh_csrf_token()
+
+    async def _refresh_csrf_token(self) -> Optional[str]:
+        """جلب CSRF token جديد من الصفحة (لازم يتنادى جوه _csrf_lock)"""
         logger.info("🔄 Fetching CSRF token...")
         stats.csrf_refreshes += 1  # ✅ رجعنا التتبع
         stats.total_requests += 1  # ✅ رجعنا التتبع
@@ -249,15 +484,14 @@ class OptimizedAPIManager:
         try:
             async with self.session.get(f"{self.base_url}/senderPage") as response:
                 if response.status == 200:
-                    html = await response.text()
-                    match = re.search(
-                        r'<meta name="csrf-token" content="([^"]+)"', html
-                    )
+                    html = await response.read()
+                    match = _CSRF_RE.search(html)
                     if match:
-                        self.csrf_token = match.group(1)
+                        self.csrf_token = match.group(1).decode("utf-8")
                         self.csrf_expires_at = datetime.now() + timedelta(
                             seconds=CSRF_TOKEN_TTL
                         )
+                        self._csrf_valid_until = time.monotonic() + CSRF_TOKEN_TTL
                         logger.info(f"✅ CSRF cached ({CSRF_TOKEN_TTL}s)")
                         return self.csrf_token
         except Exception as e:
@@ -270,18 +504,36 @@ class OptimizedAPIManager:
         """
         🎯 جلب مركزي للحسابات مع Smart Cache
         """
-        global stats
+        st = stats
 
         # تحقق من صلاحية الـ cache
         if not force_refresh and smart_cache.is_cache_valid():
-            stats.cache_hits += 1  # ✅ رجعنا التتبع
-            cached = smart_cache.get_cache()
+            st.cache_hits += 1  # ✅ رجعنا التتبع
+            cached = smart_cache.cache
             if cached:
                 return cached
 
+        generation = self._fetch_generation
+
+        async with self._fetch_lock:
+            # حد تاني جاب batch جديد واحنا مستنيين → نستخدمه
+            if (
+                self._fetch_generation != generation or not force_refresh
+            ) and smart_cache.is_cache_valid():
+                st.cache_hits += 1
+                cached = smart_cache.cache
+                if cached:
+                    return cached
+
+            return await self._fetch_batch()
+
+    async def _fetch_batch(self) -> List[Dict]:
+        """جلب الـ batch من السيرفر (لازم يتنادى جوه _fetch_lock)"""
+        st = stats
+
         logger.info("🔄 Batch fetch...")
-        stats.batch_fetches += 1  # ✅ رجعنا التتبع
-        stats.total_requests += 1  # ✅ رجعنا التتبع
+        st.batch_fetches += 1  # ✅ رجعنا التتبع
+        st.total_requests += 1  # ✅ رجعنا التتبع
 
         csrf = await self.get_csrf_token()
         if not csrf:
@@ -299,42 +551,25 @@ class OptimizedAPIManager:
             ) as response:
 
                 if response.status == 200:
-                    data = await response.json()
+                    data = _json_loads(await response.read())
 
                     if "data" in data:
-                        accounts = data["data"]
-
-                        INDEX_MAP = {
-                            "idAccount": 0,
-                            "image": 1,
-                            "Sender": 2,
-                            "Start": 3,
-                            "Last Update": 4,
-                            "Taken": 5,
-                            "Status": 6,
-                            "Available": 7,
-                            "password": 8,
-                            "backupCodes": 9,
-                            "Group": 10,
-                            "groupNameId": 11,
-                            "Take": 12,
-                            "Keep": 13,
-                        }
-
-                        parsed = []
-                        for account in accounts:
-                            if len(account) > INDEX_MAP["Sender"]:
-                                acc = {}
-                                for key, idx in INDEX_MAP.items():
-                                    acc[key] = (
-                                        str(account[idx])
-                                        if idx < len(account) and account[idx]
-                                        else ""
-                                    )
-                                parsed.append(acc)
+                        rows = data["data"]
+
+                        # ⚡ القوائم الكبيرة تتحلل في thread عشان ما نوقفش الـ event loop
+                        if len(rows) > _EXECUTOR_PARSE_THRESHOLD:
+                            loop = asyncio.get_running_loop()
+                            parsed, by_id, by_email = await loop.run_in_executor(
+                                None, _parse_and_index, rows
+                            )
+                        else:
+                            parsed, by_id, by_email = _parse_and_index(rows)
 
                         # تحديث الـ cache
-                        smart_cache.update_cache(parsed, success=True)
+                        smart_cache.update_cache(
+                            parsed, success=True, indexes=(by_id, by_email)
+                        )
+                        self._fetch_generation += 1
 
                         logger.info(
                             f"✅ Fetched {len(parsed)} accounts (TTL={smart_cache.cache_ttl:.0f}s)"
@@ -343,11 +578,11 @@ class OptimizedAPIManager:
 
                 elif response.status in [403, 419]:
                     self.csrf_token = None
-                    return await self.fetch_all_accounts_batch(force_refresh=True)
+                    return await self._fetch_batch()
 
         except Exception as e:
             logger.error(f"❌ Batch fetch error: {e}")
-            stats.errors += 1  # ✅ رجعنا التتبع
+            st.errors += 1  # ✅ رجعنا التتبع
             # استخدام Fallback
             smart_cache.update_cache([], success=False)
 
@@ -366,8 +601,19 @@ class OptimizedAPIManager:
     async def search_sender_by_email(self, email: str) -> Optional[Dict]:
         """البحث بالإيميل"""
         # تحديث الـ cache إذا لزم الأمر
-        if not smart_cache.is_cache_valid():
-            await self.fetch_all_accounts_batch()
+        # (الصف المؤقت ما فيهوش ID، فلازم نجيب الحقيقي من السيرفر)
+        # ⚡ كل المراقبين المستنيين إيميلات pending بيتجمّعوا على جلبة واحدة لكل
+        # "tick" (BURST_CACHE_TTL) بدل ما كل واحد يعمل force refresh لوحده
+        pending = (
+            smart_cache.is_pending(email)
+            and smart_cache.cache_age() >= BURST_CACHE_TTL
+        )
+        if pending or not smart_cache.is_cache_valid():
+            await self.fetch_all_accounts_batch(force_refresh=pending)
+
+        # الصف المؤقت مش حساب حقيقي (ما فيهوش ID) → زي "لسه مش موجود"
+        if smart_cache.is_pending(email):
+            return None
 
         return smart_cache.get_account_by_email(email)
 
@@ -380,8 +626,6 @@ class OptimizedAPIManager:
         amount_keep: str = "",
     ) -> Tuple[bool, str]:
         """Add sender"""
-        global stats
-
         csrf = await self.get_csrf_token()
         if not csrf:
             return False, "No CSRF"
@@ -409,25 +653,28 @@ class OptimizedAPIManager:
             ) as response:
 
                 if response.status == 200:
+                    # ✅ قراءة الـ body مرة واحدة بس (JSON أو نص)
+                    body = await response.read()
                     try:
-                        data = await response.json()
+                        data = _json_loads(body)
+                    except ValueError:
+                        data = None
+
+                    if isinstance(data, dict):
                         if "success" in data:
-                            # إلغاء الـ cache لإجبار تحديث
-                            smart_cache.cache = None
-                            smart_cache.cache_timestamp = None
+                            # صف مؤقت بدل إلغاء الـ cache كله
+                            smart_cache.add_pending(email)
                             return True, data.get("success", "Success")
                         elif "error" in data:
-                            error = data.get("error", "")
+                            error = str(data.get("error", ""))
                             if "already" in error.lower():
                                 return True, "Exists"
                             return False, error
-                    except:
-                        text = await response.text()
-                        if "success" in text.lower():
-                            smart_cache.cache = None
-                            smart_cache.cache_timestamp = None
+                    else:
+                        if b"success" in body.lower():
+                            smart_cache.add_pending(email)
                             return True, "Success"
-                        return False, text[:100]
+                        return False, body.decode("utf-8", "replace")[:100]
 
                 elif response.status in [403, 419]:
                     self.csrf_token = None
@@ -10,66 +10,320 @@
 import asyncio
 import json
 import logging
+import os
 import random
 import re
+import tempfile
+import time
 from datetime import datetime
-from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Collection, Dict, Optional, Sequence, Tuple
 
 from api_manager import smart_cache
 from config import (
     BURST_MODE_INTERVAL,
+    DEFAULT_STATUS_ID,
     FINAL_STATUSES,
     MONITORED_ACCOUNTS_FILE,
-    POLLING_INTERVALS,
+    POLLING_INTERVAL_TABLE,
     STATUS_DESCRIPTIONS_AR,
+    STATUS_IDS,
     STATUS_EMOJIS,
     TRANSITIONAL_STATUSES,
 )
 
+from sheets.queue_manager import append_to_pending
+
 # 🆕 استيراد Taken Handler
 from sheets.taken import add_to_taken_queue
 from stats import stats
+from telegram.error import BadRequest
+
+# ⚡ orjson أسرع بكتير في الكتابة والقراءة - اختياري
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 
+def _read_json(path) -> Dict:
+    """قراءة ملف JSON (orjson لو متاح)"""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path, data: Dict):
+    """كتابة ملف JSON بـ indent=2 و UTF-8 (orjson لو متاح) + fsync"""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🔤 Regex & Keywords (متجهزة مرة واحدة)
+# ═══════════════════════════════════════════════════════════════
+
+# ✅ محسّن: يدعم أرقام عربية في الإيميل (نادر بس ممكن)
+_EMAIL_RE = re.compile(r"[a-zA-Z0-9٠-٩._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+_CODE_RE = re.compile(r"\d{8,}")
+
+# 🧠 الكلمات الذكية للسحب والإبقاء
+TAKE_KEYWORDS = (
+    "اسحب",
+    "اسحبي",
+    "اسحبو",
+    "اسحبوا",
+    "يسحب",
+    "يسحبوا",
+    "خذ",
+    "خدي",
+    "خدو",
+    "take",
+)
+
+KEEP_KEYWORDS = (
+    "يسيب",
+    "سيب",
+    "سيبي",
+    "سيبو",
+    "سيبوا",
+    "اسيب",
+    "اسيبي",
+    "اسيبو",
+    "خلي",
+    "خليي",
+    "خليو",
+    "ابقي",
+    "ابقى",
+    "keep",
+)
+
+COMMAND_KEYWORDS = TAKE_KEYWORDS + KEEP_KEYWORDS
+
+
+@lru_cache(maxsize=None)
+def _amount_pattern(keyword: str) -> "re.Pattern":
+    """pattern الكلمة المفتاحية + الرقم (بيتعمل compile مرة لكل كلمة)"""
+    return re.compile(rf"{keyword}\s*(\d+)")
+
+
+@lru_cache(maxsize=None)
+def _command_pattern(keyword: str) -> "re.Pattern":
+    """pattern إزالة الأمر من السطر (case-insensitive)"""
+    return re.compile(rf"{keyword}\s*\d+", re.IGNORECASE)
+
+
 # ═══════════════════════════════════════════════════════════════
 # 💾 Database Functions with ID Validation + Source Tracking
 # ═══════════════════════════════════════════════════════════════
 
 
-def load_monitored_accounts() -> Dict:
-    """تحميل الحسابات المراقبة"""
-    if Path(MONITORED_ACCOUNTS_FILE).exists():
+# 🧠 نسخة في الذاكرة من monitored_accounts.json
+# التعديلات بتتعمل هنا وبتتكتب على الديسك مرة واحدة (flush) كل دورة
+_accounts_cache: Optional[Dict] = None
+_accounts_dirty: bool = False
+_accounts_mtime_ns: Optional[int] = None  # mtime الملف وقت آخر قراءة/كتابة
+_id_to_key: Dict[str, str] = {}  # account_id → key في الكاش
+_accounts_version: int = 0  # بيزيد مع أي تعديل (للي بيكاش حاجة مبنية على الحسابات)
+# 🔒 بيتعمل مع أول flush async (لازم يتعمل جوه الـ event loop)
+_accounts_flush_lock: Optional[asyncio.Lock] = None
+
+
+def _set_accounts_cache(accounts: Dict):
+    """تبديل الكاش وبناء فهرس الـ ID (أول key لكل ID زي البحث القديم)"""
+    global _accounts_cache, _id_to_key, _accounts_version
+
+    _accounts_cache = accounts
+    _accounts_version += 1
+    _id_to_key = {}
+    for key, data in accounts.items():
+        account_id = data.get("account_id")
+        if account_id:
+            _id_to_key.setdefault(account_id, key)
+
+
+def _read_monitored_accounts_file() -> Dict:
+    """قراءة الملف من الديسك"""
+    global _accounts_mtime_ns
+
+    try:
+        st = os.stat(MONITORED_ACCOUNTS_FILE)
+    except FileNotFoundError:
+        _accounts_mtime_ns = None
+        return {}
+
+    _accounts_mtime_ns = st.st_mtime_ns
+    if st.st_size == 0:
+        return {}
+
+    try:
+        accounts = _read_json(MONITORED_ACCOUNTS_FILE)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Error loading {MONITORED_ACCOUNTS_FILE}: {e}")
+        return {}
+
+    # الحالة بتتخزن uppercase، بنوحّد الملفات القديمة مرة واحدة عند القراءة
+    for data in accounts.values():
+        status = data.get("last_known_status")
+        if status:
+            data["last_known_status"] = status.upper()
+    return accounts
+
+
+def _write_monitored_accounts_file(accounts: Dict) -> int:
+    """
+    كتابة الملف بشكل atomic (ملف مؤقت + os.replace)
+
+    اسم الملف المؤقت فريد لكل كتابة (mkstemp) عشان أي كتابتين مع بعض
+    ما يكتبوش في نفس الملف المؤقت. بيرجع الـ mtime الجديد - المتصل هو اللي
+    بيحدّث _accounts_mtime_ns (على الـ event loop، مش من الـ thread)
+    """
+    directory = os.path.dirname(MONITORED_ACCOUNTS_FILE) or "."
+    prefix = f"{os.path.basename(MONITORED_ACCOUNTS_FILE)}."
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=".tmp")
+    os.close(fd)
+    try:
+        # mkstemp بيعمل الملف 0600 → نفس صلاحيات الملف الأصلي
+        try:
+            mode = os.stat(MONITORED_ACCOUNTS_FILE).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_file, mode)
+        _write_json(tmp_file, accounts)
+        os.replace(tmp_file, MONITORED_ACCOUNTS_FILE)
+    except BaseException:
         try:
-            with open(MONITORED_ACCOUNTS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except:
+            os.unlink(tmp_file)
+        except OSError:
             pass
-    return {}
+        raise
+    return os.stat(MONITORED_ACCOUNTS_FILE).st_mtime_ns
+
+
+def load_monitored_accounts() -> Dict:
+    """
+    تحميل الحسابات المراقبة (من الذاكرة)
+
+    بيعيد القراءة بس لو الملف اتعدل من بره (mtime اتغير)
+    ومفيش تعديلات في الذاكرة لسه متكتبتش
+    ومفيش flush شغال (الملف بيتبدل والـ mtime لسه ما اتحدثش)
+    """
+    flush_in_progress = (
+        _accounts_flush_lock is not None and _accounts_flush_lock.locked()
+    )
+    if _accounts_cache is None:
+        _set_accounts_cache(_read_monitored_accounts_file())
+    elif not _accounts_dirty and not flush_in_progress:
+        try:
+            mtime_ns = os.stat(MONITORED_ACCOUNTS_FILE).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns is not None and mtime_ns != _accounts_mtime_ns:
+            _set_accounts_cache(_read_monitored_accounts_file())
+    return _accounts_cache
+
+
+def is_account_monitored(account_id: str) -> bool:
+    """هل الحساب تحت المراقبة؟ (من فهرس الـ ID - بدون لف على الحسابات)"""
+    load_monitored_accounts()
+    return account_id in _id_to_key
+
+
+def get_monitored_accounts_version() -> int:
+    """رقم نسخة الحسابات المراقبة (بيتغير مع أي إضافة/تعديل/إعادة قراءة)"""
+    return _accounts_version
 
 
 def save_monitored_accounts(accounts: Dict):
-    """حفظ الحسابات المراقبة"""
+    """حفظ الحسابات المراقبة (فوراً)"""
+    global _accounts_dirty, _accounts_version, _accounts_mtime_ns
+
+    if accounts is not _accounts_cache:
+        _set_accounts_cache(accounts)
+    else:
+        # ممكن يكون اتعدل في مكانه قبل الحفظ
+        _accounts_version += 1
     try:
-        with open(MONITORED_ACCOUNTS_FILE, "w", encoding="utf-8") as f:
-            json.dump(accounts, f, indent=2, ensure_ascii=False)
+        _accounts_mtime_ns = _write_monitored_accounts_file(accounts)
+        _accounts_dirty = False
     except Exception as e:
+        _accounts_dirty = True
         logger.error(f"❌ Save error: {e}")
 
 
+def flush_monitored_accounts():
+    """كتابة التعديلات المتأجلة على الديسك (لو فيه تعديلات بس)"""
+    if _accounts_dirty and _accounts_cache is not None:
+        save_monitored_accounts(_accounts_cache)
+
+
+async def flush_monitored_accounts_async():
+    """
+    نفس flush_monitored_accounts بس الكتابة في thread منفصل
+    عشان الـ event loop ميقفش ورا الديسك (رسايل تليجرام وطلبات الـ API)
+
+    بناخد نسخة من الحسابات الأول، فأي تعديل أثناء الكتابة
+    بيعلّم الكاش dirty تاني ويتكتب في الـ flush الجاي
+    """
+    global _accounts_dirty, _accounts_mtime_ns, _accounts_flush_lock
+
+    if not _accounts_dirty or _accounts_cache is None:
+        return
+
+    # 🔒 flush واحد في المرة (الـ monitor + كل wait_for_status_change بيعملوا flush)
+    # عشان النسخ تتكتب بالترتيب وما حدش يبدّل الملف تحت التاني
+    if _accounts_flush_lock is None:
+        _accounts_flush_lock = asyncio.Lock()
+
+    async with _accounts_flush_lock:
+        # ممكن flush تاني يكون كتب التعديلات واحنا مستنيين
+        if not _accounts_dirty or _accounts_cache is None:
+            return
+
+        snapshot = {key: dict(data) for key, data in _accounts_cache.items()}
+        _accounts_dirty = False
+        try:
+            mtime_ns = await asyncio.to_thread(
+                _write_monitored_accounts_file, snapshot
+            )
+        except Exception as e:
+            _accounts_dirty = True
+            logger.error(f"❌ Save error: {e}")
+            return
+
+        # الـ mtime بيتحدث هنا على الـ event loop (مش من جوه الـ thread)
+        _accounts_mtime_ns = mtime_ns
+
+
 def add_monitored_account(
     email: str,
     account_id: str,
     status: str,
     chat_id: int,
     source: str = "manual",  # 🆕 NEW PARAMETER
+    now: Optional[str] = None,
 ):
     """
     🎯 إضافة حساب للمراقبة مع تخزين الـ ID الموثوق + المصدر
+
+    now: وقت ISO جاهز (الدورة بتحسبه مرة واحدة وتعدّيه)
     """
+    global _accounts_dirty, _accounts_version
+
     accounts = load_monitored_accounts()
+    now = now or datetime.now().isoformat()
 
     # استخدام الـ ID كـ key رئيسي (أكثر أماناً من الإيميل)
     key = f"{account_id}_{email}"
@@ -77,13 +331,15 @@ def add_monitored_account(
     accounts[key] = {
         "email": email,
         "account_id": account_id,
-        "last_known_status": status,
+        "last_known_status": status.upper(),
         "chat_id": chat_id,
         "source": source,  # 🆕 تتبع المصدر
-        "added_at": datetime.now().isoformat(),
-        "last_check": datetime.now().isoformat(),
+        "added_at": now,
+        "last_check": now,
     }
-    save_monitored_accounts(accounts)
+    _id_to_key.setdefault(account_id, key)
+    _accounts_dirty = True
+    _accounts_version += 1
 
     source_label = "البوت 🤖" if source == "bot" else "يدوي 👤"
     logger.info(
@@ -91,19 +347,27 @@ def add_monitored_account(
     )
 
 
+def _set_account_status(data: Dict, new_status: str, now: Optional[str] = None):
+    """تعديل حالة حساب في الكاش مباشرة (الحفظ مع flush_monitored_accounts)"""
+    global _accounts_dirty, _accounts_version
+
+    data["last_known_status"] = new_status.upper()
+    data["last_check"] = now or datetime.now().isoformat()
+    _accounts_dirty = True
+    _accounts_version += 1
+
+
 def update_monitored_account_status(account_id: str, new_status: str):
     """
     🎯 تحديث الحالة باستخدام الـ ID
     """
     accounts = load_monitored_accounts()
 
-    # البحث بالـ ID
-    for key, data in accounts.items():
-        if data.get("account_id") == account_id:
-            data["last_known_status"] = new_status
-            data["last_check"] = datetime.now().isoformat()
-            save_monitored_accounts(accounts)
-            return
+    # البحث بالـ ID من الفهرس (O(1))
+    key = _id_to_key.get(account_id)
+    if key is not None and key in accounts:
+        _set_account_status(accounts[key], new_status)
+        return
 
     logger.warning(f"⚠️ Account ID {account_id} not found in monitoring list")
 
@@ -113,15 +377,34 @@ def update_monitored_account_status(account_id: str, new_status: str):
 # ═══════════════════════════════════════════════════════════════
 
 
-def is_admin(user_id: int, admin_ids: list) -> bool:
+def is_admin(user_id: int, admin_ids: Collection[int]) -> bool:
     """التحقق من صلاحيات الأدمن"""
     return not admin_ids or user_id in admin_ids
 
 
+def get_status_id(status: str) -> int:
+    """رقم الحالة في جدول الفواصل (يتحسب مرة ويتخزن مع الحساب)"""
+    return STATUS_IDS.get(status.upper(), DEFAULT_STATUS_ID)
+
+
+# 🎲 الفواصل كـ (بداية, عرض): low + width * random() = random.uniform(low, high)
+_POLL_LOW_WIDTH = tuple((low, high - low) for low, high in POLLING_INTERVAL_TABLE)
+
+# ⏳ انتظار الدورة في continuous_monitor حسب أنشط حالة متراقبة
+_CYCLE_DELAY_LOGGING = (10, 10)  # 10 → 20s
+_CYCLE_DELAY_ACTIVE = (30, 30)  # 30 → 60s
+_CYCLE_DELAY_IDLE = (60, 60)  # 60 → 120s
+
+
+def get_adaptive_interval_by_id(status_id: int) -> float:
+    """فاصل زمني ذكي من رقم الحالة مباشرة (بدون upper/hash)"""
+    low, width = _POLL_LOW_WIDTH[status_id]
+    return round(low + width * random.random(), 2)
+
+
 def get_adaptive_interval(status: str) -> float:
     """الحصول على فاصل زمني ذكي"""
-    interval_range = POLLING_INTERVALS.get(status.upper(), POLLING_INTERVALS["DEFAULT"])
-    return round(random.uniform(*interval_range), 2)
+    return get_adaptive_interval_by_id(get_status_id(status))
 
 
 def format_number(value) -> str:
@@ -130,22 +413,28 @@ def format_number(value) -> str:
         return "0"
 
     try:
-        value_str = str(value).strip()
-        if not value_str.replace(".", "", 1).replace("-", "", 1).isdigit():
-            return value_str
-
-        num = float(value_str)
+        # ⚡ أرقام جاهزة من الـ API: مفيش داعي لتحويلها لنص وفحصها
+        # (float بـ exponent زي 1e-05 بيرجع كنص زي ما كان)
+        value_type = type(value)
+        if value_type is int or (
+            value_type is float and (value == 0 or 1e-4 <= abs(value) < 1e16)
+        ):
+            num = float(value)
+        else:
+            value_str = str(value).strip()
+            if not value_str.replace(".", "", 1).replace("-", "", 1).isdigit():
+                return value_str
+            num = float(value_str)
 
         if abs(num) < 1000:
-            return str(int(num)) if num == int(num) else str(num)
+            return str(int(num)) if num.is_integer() else str(num)
 
         k_value = num / 1000
 
         if abs(k_value) >= 1000:
             return f"{k_value:,.0f}k"
-        else:
-            return f"{int(k_value)}k"
-    except:
+        return f"{int(k_value)}k"
+    except (TypeError, ValueError):
         return str(value)
 
 
@@ -159,6 +448,17 @@ def get_status_description_ar(status: str) -> str:
     return STATUS_DESCRIPTIONS_AR.get(status.upper(), status)
 
 
+# ⚡ نسخ للـ hot paths: الحالة جاية uppercase جاهزة (مفاتيح config كلها uppercase)
+def get_status_emoji_fast(status_upper: str) -> str:
+    """emoji للحالة - status لازم تكون uppercase"""
+    return STATUS_EMOJIS.get(status_upper, "📊")
+
+
+def get_status_description_ar_fast(status_upper: str) -> str:
+    """الوصف العربي للحالة - status لازم تكون uppercase"""
+    return STATUS_DESCRIPTIONS_AR.get(status_upper, status_upper)
+
+
 def parse_sender_data(text: str) -> Dict:
     """
     تحليل بيانات السيندر من النص (نسخة مصححة 100%)
@@ -180,71 +480,28 @@ def parse_sender_data(text: str) -> Dict:
         "amount_keep": "",
     }
 
-    # ✅ محسّن: يدعم أرقام عربية في الإيميل (نادر بس ممكن)
-    email_pattern = r"[a-zA-Z0-9٠-٩._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
-
-    # 🧠 الكلمات الذكية للسحب والإبقاء
-    TAKE_KEYWORDS = [
-        "اسحب",
-        "اسحبي",
-        "اسحبو",
-        "اسحبوا",
-        "يسحب",
-        "يسحبوا",
-        "خذ",
-        "خدي",
-        "خدو",
-        "take",
-    ]
-
-    KEEP_KEYWORDS = [
-        "يسيب",
-        "سيب",
-        "سيبي",
-        "سيبو",
-        "سيبوا",
-        "اسيب",
-        "اسيبي",
-        "اسيبو",
-        "خلي",
-        "خليي",
-        "خليو",
-        "ابقي",
-        "ابقى",
-        "keep",
-    ]
-
-    potential_code_text = ""
+    found_codes = []
     password_found = False
-    lines_to_skip = set()
 
     # ════════════════════════════════════════════════════════
-    # 1️⃣ المرحلة الأولى: نجيب الإيميل والباسورد
+    # pass واحد على السطور (تصنيف كل سطر بيعتمد على اللي قبله بس):
+    # 1️⃣ الإيميل والباسورد (أول سطر بعد الإيميل)
+    # 2️⃣ الأوامر والأكواد من باقي السطور
     # ════════════════════════════════════════════════════════
-    for idx, line in enumerate(lines):
+    for line in lines:
         line = line.strip()
         if not line:
             continue
 
         # ✅ البحث عن الإيميل
-        if re.match(email_pattern, line):
+        if "@" in line and _EMAIL_RE.match(line):
             data["email"] = line.lower()
-            lines_to_skip.add(idx)
             continue
 
         # ✅ استخلاص الباسورد (أول سطر بعد الإيميل)
         if data["email"] and not password_found:
             data["password"] = line
             password_found = True
-            lines_to_skip.add(idx)
-            continue
-
-    # ════════════════════════════════════════════════════════
-    # 2️⃣ المرحلة الثانية: نجيب الأوامر والأكواد من باقي السطور
-    # ════════════════════════════════════════════════════════
-    for idx, line in enumerate(lines):
-        line = line.strip()
-        if not line or idx in lines_to_skip:
             continue
 
         # 🧠 البحث الذكي عن أمر السحب
@@ -259,24 +516,20 @@ def parse_sender_data(text: str) -> Dict:
             if keep_found:
                 data["amount_keep"] = keep_found
 
-        # ✅ جمع باقي النص للبحث عن الأكواد
-        line_for_codes = remove_commands(line, TAKE_KEYWORDS + KEEP_KEYWORDS)
+        # ✅ الأكواد من باقي السطر بعد شيل الأوامر
+        line_for_codes = remove_commands(line, COMMAND_KEYWORDS)
         if line_for_codes:
-            potential_code_text += line_for_codes + " "
+            found_codes.extend(_CODE_RE.findall(line_for_codes))
 
     # ════════════════════════════════════════════════════════
-    # 3️⃣ المرحلة الثالثة: استخلاص الأكواد النهائية
+    # 3️⃣ الأكواد النهائية: آخر 8 أرقام + شيل المكرر مع الحفاظ على الترتيب
     # ════════════════════════════════════════════════════════
-    found_codes = re.findall(r"\d{8,}", potential_code_text)
-    cleaned_codes = [code[-8:] for code in found_codes]
-    # ✅ محسّن: شيل الأكواد المكررة مع الحفاظ على الترتيب
-    unique_codes = list(dict.fromkeys(cleaned_codes))
-    data["codes"] = ",".join(unique_codes)
+    data["codes"] = ",".join(dict.fromkeys(code[-8:] for code in found_codes))
 
     return data
 
 
-def extract_amount_smart(line: str, keywords: List[str]) -> str:
+def extract_amount_smart(line: str, keywords: Sequence[str]) -> str:
     """
     🧠 استخلاص ذكي للمبلغ من السطر
     """
@@ -285,15 +538,14 @@ def extract_amount_smart(line: str, keywords: List[str]) -> str:
 
     # البحث عن الكلمة المفتاحية + الرقم
     for keyword in keywords:
-        pattern = rf"{keyword}\s*(\d+)"
-        match = re.search(pattern, line_normalized)
+        match = _amount_pattern(keyword).search(line_normalized)
         if match:
             return match.group(1)
 
     return ""
 
 
-def remove_commands(line: str, keywords: List[str]) -> str:
+def remove_commands(line: str, keywords: Sequence[str]) -> str:
     """
     🧹 إزالة الأوامر من السطر قبل البحث عن الأكواد
     """
@@ -301,34 +553,20 @@ def remove_commands(line: str, keywords: List[str]) -> str:
     line_cleaned = convert_arabic_numbers(line)
 
     for keyword in keywords:
-        pattern = rf"{keyword}\s*\d+"
-        line_cleaned = re.sub(pattern, "", line_cleaned, flags=re.IGNORECASE)
+        line_cleaned = _command_pattern(keyword).sub("", line_cleaned)
 
     return line_cleaned.strip()
 
 
+# جدول تحويل الأرقام العربية (٠-٩) → (0-9) لـ str.translate
+_ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")
+
+
 def convert_arabic_numbers(text: str) -> str:
     """
     تحويل الأرقام العربية (٠-٩) إلى إنجليزية (0-9)
     """
-    arabic_to_english = {
-        "٠": "0",
-        "١": "1",
-        "٢": "2",
-        "٣": "3",
-        "٤": "4",
-        "٥": "5",
-        "٦": "6",
-        "٧": "7",
-        "٨": "8",
-        "٩": "9",
-    }
-
-    processed_text = text
-    for ar, en in arabic_to_english.items():
-        processed_text = processed_text.replace(ar, en)
-
-    return processed_text
+    return text.translate(_ARABIC_DIGITS)
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -336,72 +574,79 @@ def convert_arabic_numbers(text: str) -> str:
 # ═══════════════════════════════════════════════════════════════
 
 
+def _append_pending(email: str, account_id: Optional[str] = None):
+    """سطر واحد append في pending.jsonl - بدون قراءة أو إعادة كتابة الملف"""
+    append_to_pending(
+        {
+            "email": email,
+            "id": account_id or "N/A",  # N/A: سيتم تحديثه لاحقاً
+            "added_at": datetime.now().isoformat(),
+        }
+    )
+
+
 def add_to_pending_queue_immediately(email: str, account_id: str):
     """
-    🆕 إضافة فورية للإيميل والID في pending.json (بدون انتظار)
+    🆕 إضافة فورية للإيميل والID في pending queue (بدون انتظار)
     تستخدم عند اكتشاف الـ ID مباشرة
     """
-    pending_file = Path("data/pending.json")
-    pending_file.parent.mkdir(exist_ok=True)
+    _append_pending(email, account_id)
+    logger.info(f"📝 Added {email} (ID: {account_id}) to pending queue IMMEDIATELY")
 
-    # تحميل البيانات الحالية
-    if pending_file.exists():
-        try:
-            with open(pending_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except:
-            data = {"emails": []}
-    else:
-        data = {"emails": []}
 
-    # إضافة الإيميل والـ ID فوراً
-    data["emails"].append(
-        {"email": email, "id": account_id, "added_at": datetime.now().isoformat()}
-    )
+def add_to_pending_queue(email: str):
+    """
+    دالة للتوافق مع Web API - تضيف بدون ID
+    """
+    _append_pending(email)
+    logger.info(f"📝 Added {email} to pending queue (via API)")
 
-    # حفظ
-    with open(pending_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
 
-    logger.info(f"📝 Added {email} (ID: {account_id}) to pending queue IMMEDIATELY")
+# ═══════════════════════════════════════════════════════════════
+# 🚀 Burst Mode Initial Monitoring + Source Tracking
+# ═══════════════════════════════════════════════════════════════
 
 
-def add_to_pending_queue(email: str):
+class _ProgressMessage:
     """
-    دالة للتوافق مع Web API - تضيف بدون ID
+    ✏️ تعديل رسالة التقدم مع rate-limit
+
+    - بيتجاهل التعديل لو النص زي اللي معروض
+    - بيتجاهله لو آخر تعديل كان من أقل من MIN_INTERVAL ثانية (إلا لو force)
+    - "message is not modified" وأخطاء BadRequest مش بتوقف المراقبة
+    - لو فيه edit_message (زي queue_edit في البوت) التعديل بيروح عن طريقه:
+      كل تعديلات الرسالة في طريق واحد بالترتيب وتحت نفس الـ rate limit
     """
-    pending_file = Path("data/pending.json")
-    pending_file.parent.mkdir(exist_ok=True)
 
-    # تحميل البيانات الحالية
-    if pending_file.exists():
-        try:
-            with open(pending_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except:
-            data = {"emails": []}
-    else:
-        data = {"emails": []}
+    __slots__ = ("message_obj", "edit_message", "last_text", "last_edit")
 
-    # إضافة الإيميل بدون ID
-    data["emails"].append(
-        {
-            "email": email,
-            "id": "N/A",  # سيتم تحديثه لاحقاً
-            "added_at": datetime.now().isoformat(),
-        }
-    )
+    MIN_INTERVAL = 2.0
 
-    # حفظ
-    with open(pending_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    def __init__(self, message_obj, edit_message: Optional[Callable] = None):
+        self.message_obj = message_obj
+        self.edit_message = edit_message
+        self.last_text: Optional[str] = None
+        self.last_edit = 0.0
 
-    logger.info(f"📝 Added {email} to pending queue (via API)")
+    async def edit(self, text: str, force: bool = False):
+        if text == self.last_text:
+            return
 
+        now = time.monotonic()
+        if not force and now - self.last_edit < self.MIN_INTERVAL:
+            return
 
-# ═══════════════════════════════════════════════════════════════
-# 🚀 Burst Mode Initial Monitoring + Source Tracking
-# ═══════════════════════════════════════════════════════════════
+        if self.edit_message is not None:
+            self.edit_message(self.message_obj, text, parse_mode="Markdown")
+        else:
+            try:
+                await self.message_obj.edit_text(text, parse_mode="Markdown")
+            except BadRequest as e:
+                logger.debug(f"✏️ Edit skipped: {e}")
+                return
+
+        self.last_text = text
+        self.last_edit = now
 
 
 async def wait_for_status_change(
@@ -410,10 +655,14 @@ async def wait_for_status_change(
     message_obj,
     chat_id: int,
     default_group_name: str,  # 🆕 NEW PARAMETER
+    edit_message: Optional[Callable] = None,
 ) -> Tuple[bool, Optional[Dict]]:
     """
     🚀 مراقبة مع Burst Mode المؤقت + تحديد المصدر
 
+    edit_message: دالة (msg, text, parse_mode=...) لجدولة تعديل رسالة التقدم
+    (البوت بيبعت queue_edit) - من غيرها بيتعمل edit_text مباشر
+
     عند إضافة حساب جديد:
     1. تفعيل Burst Mode (تحديث cache كل 2.5 ثانية)
     2. 🆕 إضافة فورية لـ pending.json عند اكتشاف ID
@@ -421,16 +670,25 @@ async def wait_for_status_change(
     4. إضافة للمراقبة فقط لو: AVAILABLE + جروب مطابق
     """
 
-    global stats
+    # 📌 متغيرات محلية بدل global/attribute lookup في كل محاولة
+    # (burst_targets بيتعدل in-place فالـ alias بيفضل متزامن)
+    final_statuses = FINAL_STATUSES
+    transitional_statuses = TRANSITIONAL_STATUSES
+    run_stats = stats
+    burst_targets = smart_cache.burst_targets
+    activate_burst = smart_cache.activate_burst_mode
+    deactivate_burst = smart_cache.deactivate_burst_target
 
     await asyncio.sleep(3.0)
 
-    start_time = datetime.now()
+    start_time = time.monotonic()
     total_elapsed = 0
     last_status = None
     status_changes = []
+    changes_text = ""
     stable_count = 0
     account_id = None
+    progress = _ProgressMessage(message_obj, edit_message)
 
     # 🚀 الخطوة 1: جلب الحساب لأول مرة والحصول على الـ ID
     logger.info(f"🔍 Looking for new account: {email}")
@@ -444,19 +702,20 @@ async def wait_for_status_change(
                 logger.info(f"✅ Found account: {email} (ID: {account_id})")
 
                 # 🚀 تفعيل Burst Mode لهذا الحساب
-                smart_cache.activate_burst_mode(account_id)
+                activate_burst(account_id)
 
                 # 🆕 إضافة فورية للـ pending.json (نفس اللحظة)
-                add_to_pending_queue_immediately(email, account_id)
+                await asyncio.to_thread(
+                    add_to_pending_queue_immediately, email, account_id
+                )
 
                 break
 
-        await message_obj.edit_text(
+        await progress.edit(
             f"🔍 *البحث الأولي عن الحساب*\n\n"
             f"📧 `{email}`\n"
             f"🔄 المحاولة: {initial_attempt}/15\n"
-            f"⏱️ ~{total_elapsed:.0f}s",
-            parse_mode="Markdown",
+            f"⏱️ ~{total_elapsed:.0f}s"
         )
 
         interval = 3.0
@@ -475,8 +734,8 @@ async def wait_for_status_change(
         try:
             # ✅ تحديث مؤشر الـ Burst ليعرض العدد الفعلي للحسابات النشطة
             mode_indicator = (
-                f"🚀 BURST ({len(smart_cache.burst_targets)})"
-                if smart_cache.burst_targets
+                f"🚀 BURST ({len(burst_targets)})"
+                if burst_targets
                 else "🔄 NORMAL"
             )
 
@@ -491,16 +750,17 @@ async def wait_for_status_change(
             status = account_info.get("Status", "غير محدد").upper()
 
             # تتبع التغييرات
-            if status != last_status:
-                change_time = (datetime.now() - start_time).total_seconds()
+            status_changed = status != last_status
+            if status_changed:
+                change_time = time.monotonic() - start_time
                 logger.info(f"📊 {email} status: {status} ({change_time:.1f}s)")
 
                 status_changes.append(
-                    {"status": status, "time": datetime.now(), "elapsed": total_elapsed}
+                    {"status": status, "time": time.monotonic(), "elapsed": total_elapsed}
                 )
 
-                if last_status and status in FINAL_STATUSES:
-                    stats.fast_detections += 1
+                if last_status and status in final_statuses:
+                    run_stats.fast_detections += 1
                     logger.info(
                         f"⚡ FAST: {last_status} → {status} in {change_time:.1f}s"
                     )
@@ -511,44 +771,42 @@ async def wait_for_status_change(
                 stable_count += 1
 
             # تحديد نوع الحالة
-            is_final = status in FINAL_STATUSES
-            is_transitional = status in TRANSITIONAL_STATUSES
+            is_final = status in final_statuses
+            is_transitional = status in transitional_statuses
 
-            status_ar = get_status_description_ar(status)
+            status_ar = get_status_description_ar_fast(status)
             status_type = (
                 "✅ نهائية"
                 if is_final
                 else "⏳ انتقالية" if is_transitional else "❓ غير محددة"
             )
 
-            # عرض سجل التغييرات
-            changes_text = ""
-            if len(status_changes) > 1:
-                changes_text = "\n📝 *التغييرات:*\n"
-                for i, change in enumerate(status_changes[-3:]):
-                    changes_text += (
-                        f"   {i+1}. `{change['status']}` ({change['elapsed']:.0f}s)\n"
-                    )
+            # عرض سجل التغييرات (بيتبني من جديد بس لما الحالة تتغير)
+            if status_changed and len(status_changes) > 1:
+                changes_text = "\n📝 *التغييرات:*\n" + "".join(
+                    f"   {i+1}. `{change['status']}` ({change['elapsed']:.0f}s)\n"
+                    for i, change in enumerate(status_changes[-3:])
+                )
 
             # رسالة التحديث
-            await message_obj.edit_text(
+            await progress.edit(
                 f"{mode_indicator} *مراقبة ذكية*\n\n"
                 f"📧 `{email}`\n"
                 f"🆔 ID: `{account_id}`\n"
                 f"📊 *تمت الإضافة لـ Google Sheets*\n\n"
                 f"📊 *الحالة:* `{status}`\n"
-                f"   {get_status_emoji(status)} {status_ar}\n\n"
+                f"   {get_status_emoji_fast(status)} {status_ar}\n\n"
                 f"🎯 النوع: {status_type}\n"
                 f"🔄 الاستقرار: {stable_count}/2\n"
                 f"{changes_text}\n"
                 f"⏱️ الوقت: {int(total_elapsed)}s\n"
                 f"🔍 المحاولة: {attempt}/{max_attempts}",
-                parse_mode="Markdown",
+                force=status_changed,  # تغيير الحالة بيظهر فوراً
             )
 
             # 🆕 منطق التوقف + شرط الإضافة الجديد
             if is_final:
-                response_time = (datetime.now() - start_time).total_seconds()
+                response_time = time.monotonic() - start_time
                 logger.info(f"✅ {email} STABLE at {status} in {response_time:.1f}s")
 
                 # 🆕 إضافة للمراقبة فقط لو: AVAILABLE + جروب مطابق
@@ -564,15 +822,16 @@ async def wait_for_status_change(
                             chat_id,
                             source="bot",  # 🆕 من البوت
                         )
+                        await flush_monitored_accounts_async()
                         added_to_monitor = True
 
                 # ✅ الحل الصحيح: إزالة الحساب الحالي فقط من قائمة الأهداف
-                smart_cache.deactivate_burst_target(account_id)
+                deactivate_burst(account_id)
 
                 return True, account_info
 
             # ✅ فاصل زمني ذكي يعتمد على قائمة الأهداف
-            if smart_cache.burst_targets:
+            if burst_targets:
                 interval = BURST_MODE_INTERVAL
             else:
                 interval = 4.0 if is_transitional else 5.0
@@ -590,7 +849,7 @@ async def wait_for_status_change(
 
     # ✅ الحل الصحيح: إزالة الحساب الحالي فقط من قائمة الأهداف
     if account_id:
-        smart_cache.deactivate_burst_target(account_id)
+        deactivate_burst(account_id)
 
     # 🆕 شرط الإضافة المحدّث
     if account_info:
@@ -599,6 +858,7 @@ async def wait_for_status_change(
             group_name = account_info.get("Group", "")
             if group_name == default_group_name:
                 add_monitored_account(email, account_id, status, chat_id, source="bot")
+                await flush_monitored_accounts_async()
         return True, account_info
 
     return False, None
@@ -609,6 +869,11 @@ async def wait_for_status_change(
 # ═══════════════════════════════════════════════════════════════
 
 
+# 📨 أقصى عدد إشعارات بتتبعت لتليجرام في نفس الوقت
+NOTIFY_CONCURRENCY = 10
+_notify_semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+
+
 async def send_status_notification(
     telegram_bot,
     email: str,
@@ -628,40 +893,49 @@ async def send_status_notification(
             logger.info(f"ℹ️ Skip notification for {email}: no chat_id")
             return
 
-        old_emoji = get_status_emoji(old_status)
-        new_emoji = get_status_emoji(new_status)
+        # الحالات جاية uppercase من المراقب
+        old_emoji = get_status_emoji_fast(old_status)
+        new_emoji = get_status_emoji_fast(new_status)
 
-        old_status_ar = get_status_description_ar(old_status)
-        new_status_ar = get_status_description_ar(new_status)
+        old_status_ar = get_status_description_ar_fast(old_status)
+        new_status_ar = get_status_description_ar_fast(new_status)
 
         # 🆕 Source line
         source_line = "🤖 المصدر: من البوت" if source == "bot" else "👤 المصدر: يدوي"
 
-        notification = (
-            f"🔔 *تنبيه تغيير الحالة!*\n\n"
-            f"📧 `{email}`\n"
-            f"{source_line}\n"  # 🆕 NEW LINE
-            f"🆔 ID: `{account_id}`\n\n"
-            f"📊 *الحالة السابقة:*\n"
-            f"   `{old_status}`\n"
-            f"   {old_emoji} {old_status_ar}\n\n"
-            f"📊 *الحالة الجديدة:*\n"
-            f"   `{new_status}`\n"
-            f"   {new_emoji} {new_status_ar}\n\n"
-            f"🕐 الوقت: {datetime.now().strftime('%H:%M:%S')}\n"
-        )
+        # 🧩 الرسالة سطور بتتجمع بـ join واحد
+        parts = [
+            "🔔 *تنبيه تغيير الحالة!*",
+            "",
+            f"📧 `{email}`",
+            source_line,  # 🆕 NEW LINE
+            f"🆔 ID: `{account_id}`",
+            "",
+            "📊 *الحالة السابقة:*",
+            f"   `{old_status}`",
+            f"   {old_emoji} {old_status_ar}",
+            "",
+            "📊 *الحالة الجديدة:*",
+            f"   `{new_status}`",
+            f"   {new_emoji} {new_status_ar}",
+            "",
+            f"🕐 الوقت: {datetime.now().strftime('%H:%M:%S')}",
+            "",
+        ]
 
         available = format_number(account_data.get("Available", "0"))
         taken = format_number(account_data.get("Taken", "0"))
 
         if available != "0" or taken != "0":
-            notification += f"\n💵 المتاح: {available}\n✅ المسحوب: {taken}\n"
+            parts.extend((f"💵 المتاح: {available}", f"✅ المسحوب: {taken}", ""))
 
-        notification += f"\n💡 `/search {email}` للتفاصيل"
+        parts.append(f"💡 `/search {email}` للتفاصيل")
+        notification = "\n".join(parts)
 
-        await telegram_bot.send_message(
-            chat_id=chat_id, text=notification, parse_mode="Markdown"
-        )
+        async with _notify_semaphore:
+            await telegram_bot.send_message(
+                chat_id=chat_id, text=notification, parse_mode="Markdown"
+            )
 
     except Exception as e:
         logger.error(f"❌ Failed to send notification: {e}")
@@ -692,6 +966,7 @@ async def continuous_monitor(
 
             # Fetch all accounts
             all_accounts = await api_manager.fetch_all_accounts_batch()
+            now_iso = datetime.now().isoformat()  # ⏱️ وقت واحد لكل الدورة
 
             # Build ID dictionary
             accounts_by_id = {
@@ -707,47 +982,49 @@ async def continuous_monitor(
                 if data.get("account_id")
             }
 
-            auto_added = False
-            for account in all_accounts:
-                account_id = account.get("idAccount")
-
-                # Skip if:
-                # - No ID
-                # - Already monitored
-                # - Not AVAILABLE
-                # - Group doesn't match
-                if (
-                    not account_id
-                    or account_id in existing_ids
-                    or account.get("Status", "").upper() != "AVAILABLE"
-                    or account.get("Group", "") != default_group_name  # 🎯 exact match
-                ):
+            # ملاحظة: add_monitored_account بيكتب في نفس الكاش، فمفيش reload
+            # فلترة المرشحين في pass واحد:
+            # - عنده ID ومش متراقب
+            # - AVAILABLE
+            # - الجروب مطابق تماماً للجروب الافتراضي
+            group_name = default_group_name
+            _upper = str.upper
+            candidates = [
+                account
+                for account in all_accounts
+                if (aid := account.get("idAccount"))
+                and aid not in existing_ids
+                and (status := account.get("Status"))
+                and _upper(status) == "AVAILABLE"
+                and account.get("Group", "") == group_name  # 🎯 exact match
+            ]
+
+            chat_id = default_chat_id or 0
+            for account in candidates:
+                account_id = account["idAccount"]
+                if account_id in existing_ids:  # ID مكرر في نفس الدفعة
                     continue
 
                 # Auto-add
                 email = account.get("Sender", "")
-                chat_id = default_chat_id or 0
                 add_monitored_account(
                     email,
                     account_id,
                     "AVAILABLE",
                     chat_id,
                     source="manual",  # 🆕 auto-discovered = manual
+                    now=now_iso,
                 )
                 existing_ids.add(account_id)
-                auto_added = True
                 logger.info(f"✅ Auto-monitored {email} (AVAILABLE + default group)")
 
-            # Reload if auto-added
-            if auto_added:
-                accounts = load_monitored_accounts()
-
             # Skip if no accounts
             if not accounts:
                 await asyncio.sleep(30)
                 continue
 
             changes_detected = 0
+            notify_tasks = []
 
             for key, data in list(accounts.items()):
                 try:
@@ -762,8 +1039,8 @@ async def continuous_monitor(
                         logger.warning(f"⚠️ Account ID {account_id} not found in batch")
                         continue
 
-                    current_status = account_info.get("Status", "غير محدد").upper()
-                    last_status = data["last_known_status"].upper()
+                    current_status = _upper(account_info.get("Status", "غير محدد"))
+                    last_status = data["last_known_status"]  # مخزّنة uppercase
 
                     if current_status != last_status:
                         changes_detected += 1
@@ -772,7 +1049,7 @@ async def continuous_monitor(
                         logger.info(f"🔔 {email}: {last_status} → {current_status}")
 
                         # 🆕 كشف AMOUNT TAKEN و DISABLED
-                        if current_status in ["AMOUNT TAKEN", "DISABLED"]:
+                        if current_status in {"AMOUNT TAKEN", "DISABLED"}:
                             taken_value = account_info.get("Taken", "0")
 
                             # التحقق من وجود قيمة صالحة
@@ -796,44 +1073,59 @@ async def continuous_monitor(
                                     f"⚠️ Invalid Taken value for {email}: {taken_value}"
                                 )
 
-                        if current_status in ["BACKUP CODE WRONG", "WRONG DETAILS"]:
+                        if current_status in {"BACKUP CODE WRONG", "WRONG DETAILS"}:
                             logger.warning(
                                 f"⚠️ {email} needs attention: {current_status}"
                             )
                         elif current_status == "TRANSFER LIST IS FULL":
                             logger.info(f"📦 {email} transfer list full")
 
-                        update_monitored_account_status(account_id, current_status)
-
-                        # ✅ إرسال الإشعار مع المصدر
-                        await send_status_notification(
-                            telegram_bot,
-                            email,
-                            account_id,
-                            last_status,
-                            current_status,
-                            data["chat_id"],
-                            account_info,
-                            data.get("source", "manual"),  # 🆕 pass source
+                        _set_account_status(data, current_status, now_iso)
+
+                        # ✅ إرسال الإشعار مع المصدر (بيتبعت مع الباقي بعد اللوب)
+                        notify_tasks.append(
+                            send_status_notification(
+                                telegram_bot,
+                                email,
+                                account_id,
+                                last_status,
+                                current_status,
+                                data["chat_id"],
+                                account_info,
+                                data.get("source", "manual"),  # 🆕 pass source
+                            )
                         )
                     else:
-                        update_monitored_account_status(account_id, current_status)
+                        # ⏱️ last_check مجرد تلميح: بيتحدث في الذاكرة من غير
+                        # ما يعلّم الكاش dirty، فالدورة اللي مفيهاش تغيير مش بتكتب
+                        data["last_check"] = now_iso
 
                 except Exception as e:
                     logger.exception(f"❌ Error checking account")
 
+            # 📨 إرسال كل إشعارات الدورة مع بعض
+            if notify_tasks:
+                results = await asyncio.gather(*notify_tasks, return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"❌ Failed to send notification: {result}")
+
+            # 💾 كتابة كل تعديلات الدورة مرة واحدة (خارج الـ event loop)
+            await flush_monitored_accounts_async()
+
             # 🎯 تعديل ذكي للـ TTL بناءً على النشاط
             smart_cache.adjust_ttl(changes_detected)
 
             # فترة الانتظار
-            statuses = [d["last_known_status"] for d in accounts.values()]
+            statuses = {d["last_known_status"] for d in accounts.values()}
 
             if "LOGGING" in statuses:
-                cycle_delay = random.uniform(10, 20)
+                low, width = _CYCLE_DELAY_LOGGING
             elif "AVAILABLE" in statuses or "ACTIVE" in statuses:
-                cycle_delay = random.uniform(30, 60)
+                low, width = _CYCLE_DELAY_ACTIVE
             else:
-                cycle_delay = random.uniform(60, 120)
+                low, width = _CYCLE_DELAY_IDLE
+            cycle_delay = low + width * random.random()
 
             logger.debug(
                 f"💤 Next check in {cycle_delay:.1f}s (TTL={smart_cache.cache_ttl:.0f}s, changes={changes_detected})"
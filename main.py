@@ -9,8 +9,12 @@
 import asyncio
 import json
 import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
 
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -23,18 +27,35 @@ from api_manager import OptimizedAPIManager, smart_cache
 from config import FINAL_STATUSES, TRANSITIONAL_STATUSES
 from core import (
     continuous_monitor,
+    flush_monitored_accounts,
     format_number,
     get_status_description_ar,
+    get_status_description_ar_fast,
     get_status_emoji,
+    get_status_emoji_fast,
+    get_monitored_accounts_version,
+    is_account_monitored,
     is_admin,
     load_monitored_accounts,
     parse_sender_data,
     wait_for_status_change,
 )
 from sheets.worker import start_sheet_worker
-from stats import stats
+from stats import stats, stats_flush_worker
 from web_api.server import start_web_api
 
+# ⚡ orjson أسرع في القراءة - اختياري
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ⚡ uvloop: event loop أسرع (libuv) - اختياري
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # ═══════════════════════════════════════════════════════════════
 # 📝 Logging Configuration
 # ═══════════════════════════════════════════════════════════════
@@ -50,13 +71,20 @@ logger = logging.getLogger(__name__)
 # ⚙️ Load Configuration
 # ═══════════════════════════════════════════════════════════════
 
-with open("config.json", "r", encoding="utf-8") as f:
-    CONFIG = json.load(f)
+if orjson is not None:
+    with open("config.json", "rb") as f:
+        CONFIG = orjson.loads(f.read())
+else:
+    with open("config.json", "r", encoding="utf-8") as f:
+        CONFIG = json.load(f)
 
 # ═══════════════════════════════════════════════════════════════
 # 🎯 Global Constants
 # ═══════════════════════════════════════════════════════════════
 
+# 👮 الأدمنز (frozenset مرة واحدة بدل قراءة CONFIG مع كل رسالة)
+ADMIN_IDS = frozenset(CONFIG["telegram"].get("admin_ids", []))
+
 # 🎯 تحديد حد أقصى 10 خيوط مؤقتة في نفس الوقت
 MAX_CONCURRENT_MONITORS = 10
 monitoring_semaphore = asyncio.Semaphore(MAX_CONCURRENT_MONITORS)
@@ -65,49 +93,94 @@ monitoring_semaphore = asyncio.Semaphore(MAX_CONCURRENT_MONITORS)
 telegram_app = None
 api_manager = None
 
+# ═══════════════════════════════════════════════════════════════
+# ✏️ Edit Coalescer (حد تليجرام ~30 رسالة/ثانية للبوت كله)
+# ═══════════════════════════════════════════════════════════════
+
+EDIT_RATE_PER_SEC = 28
+
+# (chat_id, message_id) → (msg, text, parse_mode) - آخر نص بس لكل رسالة
+_pending_edits = {}
+_edits_available = asyncio.Event()
+
+
+def queue_edit(msg, text: str, parse_mode: Optional[str] = None):
+    """
+    جدولة تعديل رسالة بدل await مباشر
+
+    لو فيه تعديل لسه متبعتش لنفس الرسالة بيتستبدل بالجديد
+    """
+    _pending_edits[(msg.chat_id, msg.message_id)] = (msg, text, parse_mode)
+    _edits_available.set()
+
+
+async def edit_worker():
+    """
+    🔁 Worker واحد بيبعت التعديلات المتجمعة بمعدل ≤ EDIT_RATE_PER_SEC
+    """
+    interval = 1 / EDIT_RATE_PER_SEC
+
+    while True:
+        await _edits_available.wait()
+        _edits_available.clear()
+
+        while _pending_edits:
+            key = next(iter(_pending_edits))
+            msg, text, parse_mode = _pending_edits.pop(key)
+            try:
+                await msg.edit_text(text, parse_mode=parse_mode)
+            except BadRequest as e:
+                # "message is not modified" وما شابه - مش مشكلة
+                logger.debug(f"✏️ Edit skipped for message {key[1]}: {e}")
+            except Exception as e:
+                logger.warning(f"⚠️ Edit failed for message {key[1]}: {e}")
+            await asyncio.sleep(interval)
+
+
 # ═══════════════════════════════════════════════════════════════
 # 🎯 Bot Commands
 # ═══════════════════════════════════════════════════════════════
 
 
+# 👋 الجزء الثابت من رسالة /start (بيتبني مرة واحدة)
+WELCOME_TEXT = (
+    "🚀 *بوت السيندرز المتطور*\n"
+    "🧠 *Adaptive Hybrid Monitoring*\n\n"
+    "*📝 طريقة الإضافة:*\n"
+    "```\n"
+    "email@gmail.com\n"
+    "password123\n"
+    "12345678\n"
+    "اسحب 100\n"
+    "يسيب 50\n"
+    "```\n\n"
+    "*✨ المميزات المتقدمة:*\n"
+    "• 🎯 Strict ID Validation\n"
+    "• 🚀 Temporary Burst Mode (60s)\n"
+    "• 🧠 Smart TTL (2-10 دقيقة)\n"
+    "• 🔄 Fallback Mechanism\n"
+    "• 🌐 Bilingual Display\n"
+    "• 🆕 Source Tracking (bot/manual)\n"
+    "• 🆕 Auto-Discovery\n"
+    "• 🆕 Instant Google Sheets Sync\n"
+    "• 🆕 Web API Integration\n\n"
+    "*⏱️ زمن الاستجابة: 3-10 ثوانٍ*\n\n"
+    "*🔍 الأوامر:*\n"
+    "`/search email@gmail.com`\n"
+    "`/monitored` - الحسابات المراقبة\n"
+    "`/stats` - الإحصائيات\n"
+    "`/status` - حالة النظام"
+)
+
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """أمر /start - الرسالة الترحيبية"""
     user = update.effective_user
-    admin_ids = CONFIG["telegram"].get("admin_ids", [])
-
-    if not is_admin(user.id, admin_ids):
+    if not is_admin(user.id, ADMIN_IDS):
         await update.message.reply_text("❌ عذراً، هذا البوت خاص بالمسؤولين.")
         return
 
-    welcome_msg = (
-        f"مرحباً {user.first_name}! 👋\n\n"
-        "🚀 *بوت السيندرز المتطور*\n"
-        "🧠 *Adaptive Hybrid Monitoring*\n\n"
-        "*📝 طريقة الإضافة:*\n"
-        "```\n"
-        "email@gmail.com\n"
-        "password123\n"
-        "12345678\n"
-        "اسحب 100\n"
-        "يسيب 50\n"
-        "```\n\n"
-        "*✨ المميزات المتقدمة:*\n"
-        "• 🎯 Strict ID Validation\n"
-        "• 🚀 Temporary Burst Mode (60s)\n"
-        "• 🧠 Smart TTL (2-10 دقيقة)\n"
-        "• 🔄 Fallback Mechanism\n"
-        "• 🌐 Bilingual Display\n"
-        "• 🆕 Source Tracking (bot/manual)\n"
-        "• 🆕 Auto-Discovery\n"
-        "• 🆕 Instant Google Sheets Sync\n"
-        "• 🆕 Web API Integration\n\n"
-        "*⏱️ زمن الاستجابة: 3-10 ثوانٍ*\n\n"
-        "*🔍 الأوامر:*\n"
-        "`/search email@gmail.com`\n"
-        "`/monitored` - الحسابات المراقبة\n"
-        "`/stats` - الإحصائيات\n"
-        "`/status` - حالة النظام"
-    )
+    welcome_msg = f"مرحباً {user.first_name}! 👋\n\n" + WELCOME_TEXT
 
     await update.message.reply_text(welcome_msg, parse_mode="Markdown")
 
@@ -126,6 +199,7 @@ async def monitor_account_task(api_manager, email, msg, chat_id, group_name):
                 msg,
                 chat_id,
                 group_name,
+                edit_message=queue_edit,
             )
 
             if account_info:
@@ -159,9 +233,10 @@ async def monitor_account_task(api_manager, email, msg, chat_id, group_name):
                 if available != "0" or taken != "0":
                     result_text += f"\n💵 المتاح: {available}\n✅ المسحوب: {taken}"
 
-                await msg.edit_text(result_text, parse_mode="Markdown")
+                queue_edit(msg, result_text, parse_mode="Markdown")
             else:
-                await msg.edit_text(
+                queue_edit(
+                    msg,
                     f"⚠️ *تمت الإضافة لكن لم يتم العثور على الحساب*\n"
                     f"📧 `{email}`\n"
                     f"💡 جرب `/search {email}` بعد قليل",
@@ -170,33 +245,36 @@ async def monitor_account_task(api_manager, email, msg, chat_id, group_name):
 
         except Exception as e:
             logger.exception(f"❌ Monitoring error: {email}")
-            await msg.edit_text(f"❌ خطأ في المراقبة: {str(e)}")
+            queue_edit(msg, f"❌ خطأ في المراقبة: {str(e)}")
 
 
-async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """معالجة إضافة حساب جديد"""
-    admin_ids = CONFIG["telegram"].get("admin_ids", [])
+# 🧵 طابور لكل شات: إضافات نفس الشات بالترتيب، والشاتات التانية مش بتستنى
+_chat_queues: Dict[int, asyncio.Queue] = {}
 
-    if not is_admin(update.effective_user.id, admin_ids):
-        return
 
-    # تجاهل الأوامر
-    if update.message.text.startswith("/"):
-        return
+def get_chat_queue(chat_id: int) -> asyncio.Queue:
+    """طابور الشات (بيشغّل worker ليه أول مرة)"""
+    queue = _chat_queues.get(chat_id)
+    if queue is None:
+        queue = _chat_queues[chat_id] = asyncio.Queue()
+        asyncio.create_task(chat_worker(chat_id, queue))
+    return queue
 
-    # تحليل البيانات
-    data = parse_sender_data(update.message.text)
 
-    if not data["email"] or not data["password"]:
-        await update.message.reply_text(
-            "❌ بيانات ناقصة! تأكد من إدخال الإيميل والباسورد."
-        )
-        return
+async def chat_worker(chat_id: int, queue: asyncio.Queue):
+    """🔁 تنفيذ طلبات الإضافة لشات واحد بالترتيب"""
+    while True:
+        data, msg = await queue.get()
+        try:
+            await add_account_job(data, msg, chat_id)
+        except Exception:
+            logger.exception(f"❌ Chat worker error ({chat_id})")
+        finally:
+            queue.task_done()
 
-    msg = await update.message.reply_text(
-        f"⏳ *جاري الإضافة...*\n📧 `{data['email']}`", parse_mode="Markdown"
-    )
 
+async def add_account_job(data: Dict, msg, chat_id: int):
+    """إضافة الحساب للموقع ثم تشغيل المراقبة في Task منفصل"""
     try:
         # إضافة الحساب
         success, message = await api_manager.add_sender(
@@ -208,7 +286,8 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
         if success:
-            await msg.edit_text(
+            queue_edit(
+                msg,
                 f"✅ *تمت الإضافة!*\n"
                 f"📧 `{data['email']}`\n\n"
                 f"🚀 *تفعيل BURST MODE...*\n"
@@ -222,27 +301,53 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     api_manager,
                     data["email"],
                     msg,
-                    update.effective_chat.id,
+                    chat_id,
                     CONFIG["website"]["defaults"]["group_name"],
                 )
             )
 
         else:
-            await msg.edit_text(
+            queue_edit(
+                msg,
                 f"❌ *فشلت الإضافة*\n" f"📧 `{data['email']}`\n" f"⚠️ {message}",
                 parse_mode="Markdown",
             )
 
     except Exception as e:
         logger.exception(f"❌ Error adding account: {data['email']}")
-        await msg.edit_text(f"❌ خطأ غير متوقع: {str(e)}")
+        queue_edit(msg, f"❌ خطأ غير متوقع: {str(e)}")
+
+
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """معالجة إضافة حساب جديد"""
+    if not is_admin(update.effective_user.id, ADMIN_IDS):
+        return
+
+    # تجاهل الأوامر
+    if update.message.text.startswith("/"):
+        return
+
+    # تحليل البيانات
+    data = parse_sender_data(update.message.text)
+
+    if not data["email"] or not data["password"]:
+        await update.message.reply_text(
+            "❌ بيانات ناقصة! تأكد من إدخال الإيميل والباسورد."
+        )
+        return
+
+    msg = await update.message.reply_text(
+        f"⏳ *جاري الإضافة...*\n📧 `{data['email']}`", parse_mode="Markdown"
+    )
+
+    # 📬 الإضافة نفسها في طابور الشات - الهاندلر بيرجع فوراً
+    chat_id = update.effective_chat.id
+    get_chat_queue(chat_id).put_nowait((data, msg))
 
 
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """أمر /search - البحث عن حساب"""
-    admin_ids = CONFIG["telegram"].get("admin_ids", [])
-
-    if not is_admin(update.effective_user.id, admin_ids):
+    if not is_admin(update.effective_user.id, ADMIN_IDS):
         return
 
     if not context.args:
@@ -286,13 +391,8 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f"💵 المتاح: {format_number(result.get('Available', '0'))}"
             )
 
-            accounts = load_monitored_accounts()
             # تحقق بالـ ID
-            is_monitored = any(
-                d.get("account_id") == account_id for d in accounts.values()
-            )
-
-            if is_monitored:
+            if is_account_monitored(account_id):
                 text += f"\n\n🔄 *هذا الحساب تحت المراقبة* (ID-based)"
 
             await msg.edit_text(text, parse_mode="Markdown")
@@ -306,11 +406,15 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await msg.edit_text(f"❌ خطأ في البحث: {str(e)}")
 
 
+# 🧠 آخر نص /monitored متبني: ((نسخة الحسابات, TTL), النص)
+_monitored_text_cache: Optional[Tuple[Tuple[int, int], str]] = None
+
+
 async def monitored_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """أمر /monitored - عرض الحسابات المراقبة مع المصدر"""
-    admin_ids = CONFIG["telegram"].get("admin_ids", [])
+    global _monitored_text_cache
 
-    if not is_admin(update.effective_user.id, admin_ids):
+    if not is_admin(update.effective_user.id, ADMIN_IDS):
         return
 
     accounts = load_monitored_accounts()
@@ -319,42 +423,49 @@ async def monitored_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("📭 لا توجد حسابات تحت المراقبة حالياً")
         return
 
-    text = f"🔄 *الحسابات المراقبة ({len(accounts)})*\n\n"
+    # ⚡ النص بيتبني تاني بس لو الحسابات اتغيرت أو الـ TTL اللي في الفوتر اتغير
+    cache_key = (get_monitored_accounts_version(), round(smart_cache.cache_ttl))
+    if _monitored_text_cache is not None and _monitored_text_cache[0] == cache_key:
+        await update.message.reply_text(
+            _monitored_text_cache[1], parse_mode="Markdown"
+        )
+        return
+
+    parts = [f"🔄 *الحسابات المراقبة ({len(accounts)})*\n\n"]
 
     for key, data in accounts.items():
         email = data.get("email", "unknown")
         account_id = data.get("account_id", "N/A")
+        # الحالات محفوظة upper-case أصلاً → lookup مباشر من غير .upper()
         status = data["last_known_status"]
-        status_ar = get_status_description_ar(status)
+        status_ar = get_status_description_ar_fast(status)
 
         # 🆕 عرض المصدر
         source = data.get("source", "manual")  # default للحسابات القديمة
         source_line = "🤖 من البوت" if source == "bot" else "👤 يدوي"
 
-        text += (
+        parts.append(
             f"📧 `{email}`\n"
             f"   {source_line}\n"  # 🆕 NEW LINE
             f"   🆔 `{account_id}`\n"
             f"   📊 *{status}*\n"
-            f"   {get_status_emoji(status)} {status_ar}\n\n"
+            f"   {get_status_emoji_fast(status)} {status_ar}\n\n"
         )
 
-    text += f"⚡ Mode: Hybrid (TTL={smart_cache.cache_ttl:.0f}s)"
+    parts.append(f"⚡ Mode: Hybrid (TTL={smart_cache.cache_ttl:.0f}s)")
+    text = "".join(parts)
+    _monitored_text_cache = (cache_key, text)
 
     await update.message.reply_text(text, parse_mode="Markdown")
 
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """أمر /stats - عرض الإحصائيات"""
-    admin_ids = CONFIG["telegram"].get("admin_ids", [])
-
-    if not is_admin(update.effective_user.id, admin_ids):
+    if not is_admin(update.effective_user.id, ADMIN_IDS):
         return
 
-    from datetime import datetime
-
-    reset_time = datetime.fromisoformat(stats.last_reset)
-    hours = max((datetime.now() - reset_time).seconds / 3600, 0.01)
+    reset_time = stats.reset_datetime
+    hours = max((time.monotonic() - stats.reset_monotonic) / 3600, 0.01)
     requests_per_hour = stats.total_requests / hours
 
     text = (
@@ -379,13 +490,9 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """أمر /status - حالة النظام"""
-    admin_ids = CONFIG["telegram"].get("admin_ids", [])
-
-    if not is_admin(update.effective_user.id, admin_ids):
+    if not is_admin(update.effective_user.id, ADMIN_IDS):
         return
 
-    from datetime import datetime
-
     accounts = load_monitored_accounts()
     csrf_valid = (
         api_manager.csrf_expires_at and datetime.now() < api_manager.csrf_expires_at
@@ -441,6 +548,12 @@ async def post_init(application: Application):
     logger.info("🔧 Initializing API Manager...")
     await api_manager.initialize()
 
+    # ✏️ worker تعديلات الرسايل
+    asyncio.create_task(edit_worker())
+
+    # 💾 حفظ الإحصائيات على فترات (مش مع كل عداد)
+    asyncio.create_task(stats_flush_worker())
+
     # 🆕 تمرير parameters للمراقب
     default_group_name = CONFIG["website"]["defaults"]["group_name"]
     admin_ids = CONFIG["telegram"].get("admin_ids", [])
@@ -469,6 +582,19 @@ async def post_init(application: Application):
     logger.info("✅ System ready!")
 
 
+async def post_shutdown(application: Application):
+    """
+    حفظ الإحصائيات + قفل الـ HTTP session على نفس الـ event loop اللي اتعملت عليه
+    (الـ session واحدة طول عمر البوت - keep-alive + connection pool)
+    """
+    # run_polling بيمسك Ctrl+C بنفسه، فلازم الحفظ يحصل هنا
+    await stats.flush_async()
+
+    if api_manager:
+        await api_manager.close()
+        logger.info("🔌 API session closed")
+
+
 def main():
     """
     🚀 تشغيل البوت الرئيسي
@@ -491,6 +617,11 @@ def main():
     print("\n📊 Intelligent & Efficient!")
     print("=" * 60 + "\n")
 
+    # ⚡ لازم قبل ما البوت يعمل الـ event loop
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("⚡ Using uvloop event loop")
+
     # إنشاء API Manager
     api_manager = OptimizedAPIManager(CONFIG)
 
@@ -499,6 +630,7 @@ def main():
         Application.builder()
         .token(CONFIG["telegram"]["bot_token"])
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
 
@@ -535,13 +667,10 @@ if __name__ == "__main__":
         main()
     except KeyboardInterrupt:
         print("\n⚠️ Bot stopped by user")
-        stats.save()
+        stats.flush()
     except Exception as e:
         print(f"❌ Fatal error: {e}")
         logger.exception("❌ Fatal error occurred")
-        stats.save()
+        stats.flush()
     finally:
-        import asyncio
-
-        if api_manager:
-            asyncio.run(api_manager.close())
+        flush_monitored_accounts()
@@ -7,15 +7,30 @@
 ✅ يكتب في الأعمدة المحددة فقط بدون مسح باقي البيانات
 """
 
+import asyncio
+import functools
+import hashlib
 import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Dict, List, Tuple
 
+import httplib2
 from google.oauth2.service_account import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 logger = logging.getLogger(__name__)
 
+# 📁 مكان ملفات العلامة (نفس مجلد بيانات الـ queues)
+HEADER_MARKER_DIR = Path("data")
+
+# ⏱️ httplib2 من غير timeout ممكن يعلّق للأبد وهو ماسك الـ lock
+HTTP_TIMEOUT = 60  # ثانية
+
 
 class GoogleSheetsAPI:
     """
@@ -26,7 +41,16 @@ class GoogleSheetsAPI:
     ID_COLUMN_INDEX = 25  # Z = العمود رقم 26 (0-based = 25)
     ID_COLUMN_LETTER = "Z"
 
-    def __init__(self, credentials_file: str, spreadsheet_id: str, sheet_name: str):
+    # IDs مش حقيقية (placeholder) → خلية Z بتتساب فاضية
+    _INVALID_IDS = frozenset({"N/A", "pending", "api", ""})
+
+    def __init__(
+        self,
+        credentials_file: str,
+        spreadsheet_id: str,
+        sheet_name: str,
+        max_concurrency: int = 1,
+    ):
         """
         تهيئة Google Sheets API
 
@@ -34,10 +58,22 @@ class GoogleSheetsAPI:
             credentials_file: مسار ملف credentials.json
             spreadsheet_id: ID الشيت
             sheet_name: اسم الورقة
+            max_concurrency: أقصى عدد نداءات شغالة في نفس الوقت
         """
         self.spreadsheet_id = spreadsheet_id
         self.sheet_name = sheet_name
 
+        # 🔒 googleapiclient (httplib2) مش thread-safe: كل thread ليه اتصال
+        # و service خاصين بيه
+        self._local = threading.local()
+
+        # 🧵 threads ثابتة للشيت بس (بعدد max_concurrency): نفس الاتصالات
+        # keep-alive بتتعاد كل مرة بدل ما تتوزع على threads الـ default executor
+        # (كل thread جديد = TLS handshake جديد) - وده كمان حد التوازي
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_concurrency), thread_name_prefix="sheets"
+        )
+
         # Authentication
         try:
             self.creds = Credentials.from_service_account_file(
@@ -45,22 +81,65 @@ class GoogleSheetsAPI:
                 scopes=["https://www.googleapis.com/auth/spreadsheets"],
             )
 
-            self.service = build("sheets", "v4", credentials=self.creds)
-            self.sheet = self.service.spreadsheets()
+            # أول service (بتاع الـ thread الحالي) - بيتأكد إن الـ credentials شغالة
+            self._thread_service()
 
             logger.info(f"✅ Google Sheets API initialized: {sheet_name}")
             logger.info(f"🎯 ID column fixed at: {self.ID_COLUMN_LETTER}")
 
-            # التأكد من وجود header في Z1
-            self._ensure_id_header()
+            # التأكد من وجود header في Z1 (مرة واحدة لكل شيت - مش مع كل تشغيل)
+            marker = self._header_marker_path()
+            if marker.exists():
+                logger.info("✅ Header 'ID' verified before - skipping check")
+            elif self._ensure_id_header():
+                try:
+                    marker.parent.mkdir(exist_ok=True)
+                    marker.touch()
+                except OSError as e:
+                    logger.debug(f"Could not write header marker: {e}")
 
         except Exception as e:
             logger.error(f"❌ Failed to initialize Google Sheets API: {e}")
             raise
 
-    def _ensure_id_header(self):
+    def _thread_service(self):
+        """
+        🔌 service خاص بالـ thread الحالي (اتصال keep-alive واحد لكل thread)
+        بيتعمل مرة واحدة في أول نداء من الـ thread وبعدين بيتعاد استخدامه
+        """
+        service = getattr(self._local, "service", None)
+        if service is None:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            # ⚡ cache_discovery=False: الـ discovery doc بييجي من الباكدج نفسها،
+            # فمافيش داعي لمحاولة الـ file_cache (import فاشل + warning كل تشغيل)
+            service = build("sheets", "v4", http=http, cache_discovery=False)
+            self._local.service = service
+            self._local.sheet = service.spreadsheets()
+        return service
+
+    @property
+    def service(self):
+        """service بتاع الـ thread الحالي"""
+        return self._thread_service()
+
+    @property
+    def sheet(self):
+        """spreadsheets() resource بتاع الـ thread الحالي"""
+        self._thread_service()
+        return self._local.sheet
+
+    def _header_marker_path(self) -> Path:
+        """ملف علامة إن الـ header اتأكد منه لـ (spreadsheet_id, sheet_name)"""
+        key = f"{self.spreadsheet_id}:{self.sheet_name}".encode("utf-8")
+        digest = hashlib.sha1(key).hexdigest()[:16]
+        return HEADER_MARKER_DIR / f".sheets_header_{digest}"
+
+    def _ensure_id_header(self) -> bool:
         """
         التأكد من وجود header "ID" في العمود Z1
+
+        Returns:
+            True لو الـ header موجود أو اتكتب
         """
         try:
             # قراءة Z1
@@ -87,19 +166,39 @@ class GoogleSheetsAPI:
             else:
                 logger.info("✅ Header 'ID' already exists in column Z1")
 
+            return True
+
         except Exception as e:
             logger.warning(f"⚠️ Could not verify/set ID header: {e}")
+            return False
 
-    def append_emails(self, emails_data: List[Dict]) -> Tuple[bool, str]:
+    async def call(self, func, *args, **kwargs):
         """
-        ✅ إضافة Email + ID للشيت (نفس سلوك الكود القديم)
+        ⚡ تشغيل نداء blocking لـ Google API في thread
+        عشان الـ event loop (البوت والمراقب) ميقفش ورا الـ HTTPS round-trip
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
 
-        - يكتب Email في عمود A فقط
-        - يكتب ID في عمود Z فقط
+    async def append_emails(self, emails_data: List[Dict]) -> Tuple[bool, str]:
+        """
+        ✅ إضافة Email + ID للشيت (في thread - مش بيوقف الـ event loop)
+        """
+        return await self.call(self._append_emails_sync, emails_data)
+
+    def _append_emails_sync(self, emails_data: List[Dict]) -> Tuple[bool, str]:
+        """
+        ✅ إضافة Email + ID للشيت
+
+        - يكتب Email في عمود A فقط (append على A:A - بعد آخر صف فيه Email)
+        - يكتب ID في عمود Z فقط (في نفس الصفوف اللي الـ append رجّعها)
         - لا يمسح أو يعدل أي أعمدة أخرى نهائياً
 
         Args:
             emails_data: List of {"email": str, "id": str}
+                (أي dict فيه email/id - عناصر الـ queue نفسها بتتبعت زي ما هي)
 
         Returns:
             (success: bool, message: str)
@@ -110,78 +209,65 @@ class GoogleSheetsAPI:
         try:
             logger.info(f"📤 Adding {len(emails_data)} rows (Email + ID only)")
 
-            # 1️⃣ الحصول على آخر صف في العمود A (نفس الكود القديم)
-            result_range = (
-                self.sheet.values()
-                .get(spreadsheetId=self.spreadsheet_id, range=f"{self.sheet_name}!A:A")
-                .execute()
-            )
-
-            existing_values = result_range.get("values", [])
-            next_row = len(existing_values) + 1
-
-            logger.info(f"   📍 Last row: {len(existing_values)}, Next row: {next_row}")
-
-            # 2️⃣ تجهيز البيانات لكل عمود على حدة
+            # 1️⃣ تجهيز البيانات لكل عمود على حدة
             email_values = []  # للـ Email (عمود A فقط)
             id_values = []  # للـ ID (عمود Z فقط)
 
             for item in emails_data:
-                # Email في عمود A
-                email = item.get("email", "")
-                email_values.append([email])  # قيمة واحدة فقط
+                email_values.append([item.get("email", "")])
 
                 # ID في عمود Z
                 item_id = item.get("id", "")
 
                 # ✅ تحقق: ID صالح
-                if item_id and item_id not in ["N/A", "pending", "api", ""]:
-                    id_values.append([str(item_id)])  # قيمة واحدة فقط
+                if item_id and item_id not in self._INVALID_IDS:
+                    id_values.append([str(item_id)])
                 else:
                     id_values.append([""])  # فراغ لو مافيش ID
 
-            # 3️⃣ استخدام batchUpdate للكتابة في الأعمدة المحددة فقط
-            last_row = next_row + len(emails_data) - 1
-
-            # Range لكل عمود على حدة
-            email_range = f"{self.sheet_name}!A{next_row}:A{last_row}"
-            id_range = f"{self.sheet_name}!Z{next_row}:Z{last_row}"
-
-            logger.info(f"   📧 Email range: {email_range}")
-            logger.info(f"   🆔 ID range: {id_range}")
-
-            # 4️⃣ استخدام batchUpdate - يكتب في الأعمدة المحددة فقط
-            batch_data = [
-                {"range": email_range, "values": email_values},
-                {"range": id_range, "values": id_values},
-            ]
-
-            body = {"valueInputOption": "USER_ENTERED", "data": batch_data}
-
-            logger.info(f"   🔧 Using batchUpdate (writes to specific columns only)")
-
+            # 2️⃣ append على العمود A بس: الشيت بيحدد الصف اللي بعد آخر Email
+            # (زي len(A:A) + 1 زمان - من غير ما نسحب العمود كله)
             result = (
                 self.sheet.values()
-                .batchUpdate(spreadsheetId=self.spreadsheet_id, body=body)
+                .append(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{self.sheet_name}!A:A",
+                    valueInputOption="USER_ENTERED",
+                    insertDataOption="OVERWRITE",
+                    body={"values": email_values},
+                )
                 .execute()
             )
 
-            # معلومات عن النتيجة
-            total_updated_cells = result.get("totalUpdatedCells", 0)
-            total_updated_rows = result.get("totalUpdatedRows", 0)
-            responses = result.get("responses", [])
+            updated_range = result.get("updates", {}).get("updatedRange", "")
+            match = re.search(r"!A(\d+)", updated_range)
+            if not match:
+                logger.error(f"❌ Unexpected append range: {updated_range!r}")
+                return False, f"Unexpected append range: {updated_range}"
 
-            logger.info(f"✅ Success!")
-            logger.info(f"   ✅ Updated rows: {total_updated_rows}")
-            logger.info(f"   ✅ Updated cells: {total_updated_cells}")
+            # 3️⃣ الـ ID في عمود Z في نفس الصفوف بالظبط
+            next_row = int(match.group(1))
+            last_row = next_row + len(emails_data) - 1
+            id_range = (
+                f"{self.sheet_name}!{self.ID_COLUMN_LETTER}{next_row}:"
+                f"{self.ID_COLUMN_LETTER}{last_row}"
+            )
+
+            self.sheet.values().update(
+                spreadsheetId=self.spreadsheet_id,
+                range=id_range,
+                valueInputOption="USER_ENTERED",
+                body={"values": id_values},
+            ).execute()
+
+            logger.info(f"✅ Success! Email range: {updated_range}")
+            logger.info(f"   🆔 ID range: {id_range}")
             logger.info(f"   ✅ Only Email (A) and ID (Z) columns were modified")
-            logger.info(f"   ✅ Other columns in the row remain untouched")
 
             # عرض عينة من البيانات
-            if email_values and id_values:
-                sample_email = email_values[0][0]
-                sample_id = id_values[0][0]
-                logger.info(f"   📝 Sample: Email='{sample_email}', ID='{sample_id}'")
+            logger.info(
+                f"   📝 Sample: Email='{email_values[0][0]}', ID='{id_values[0][0]}'"
+            )
 
             return True, f"Added {len(emails_data)} rows"
 
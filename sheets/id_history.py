@@ -4,13 +4,24 @@
 📜 ID History Manager
 تسجيل الـ IDs المضافة للشيت والاحتفاظ بآخر 7 أيام فقط
 ✅ مع دعم الإضافة الدفعية
+✅ الملف JSONL (إدخال في كل سطر): الإضافة append بس، وإعادة الكتابة مع التنظيف
 """
 
+import asyncio
+import atexit
 import json
 import logging
-from datetime import datetime, timedelta
+import os
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Set
+
+# ⚡ orjson أسرع بكتير في القراءة والكتابة - اختياري
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +29,35 @@ logger = logging.getLogger(__name__)
 # ⚙️ ثوابت
 # ═══════════════════════════════════════════════════════════════
 
-HISTORY_FILE = Path("data/id_history.json")
+HISTORY_FILE = Path("data/id_history.jsonl")
+LEGACY_HISTORY_FILE = Path("data/id_history.json")  # الصيغة القديمة (dict واحد)
 RETENTION_DAYS = 7  # الاحتفاظ بآخر 7 أيام فقط
+SECONDS_PER_DAY = 86400
+
+# 🧹 التنظيف مع الإضافة: مرة كل ساعة بالكتير، أو لو السجل كبر
+CLEANUP_INTERVAL = 3600  # ثانية
+CLEANUP_MAX_ENTRIES = 5000
+
+# 💾 الإضافات بتتجمع في الذاكرة وتتكتب append واحد كل 10 ثواني أو 1000 إدخال
+# (الفهرس في الذاكرة بيتحدث على طول - check_id_exists بيشوفها فوراً)
+APPEND_FLUSH_INTERVAL = 10.0  # ثانية
+APPEND_FLUSH_MAX_ENTRIES = 1000
+
+# قيم مش IDs حقيقية (placeholder) - مش بتتسجل
+_INVALID_IDS = frozenset({"N/A", "pending", "api", "", None})
+
+
+# 🧠 نسخة في الذاكرة من id_history.jsonl (بنفس شكل {"ids": [...]} القديم)
+# بتتقري من الديسك بس لو الملف اتعدل من بره (mtime اتغير)
+_history_cache: Optional[Dict] = None
+_history_dirty: bool = False
+_history_mtime_ns: Optional[int] = None  # mtime الملف وقت آخر قراءة/كتابة
+_history_ids: Set[str] = set()  # فهرس الـ IDs للبحث O(1)
+_last_cleanup: Optional[float] = None  # time.monotonic() لآخر تنظيف
+_legacy_checked: bool = False
+_data_dir_ready: bool = False
+_append_buffer: List[Dict] = []  # إدخالات في الكاش لسه ما اتكتبتش في الملف
+_last_append_flush: float = 0.0  # time.monotonic() لآخر كتابة للـ buffer
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -27,50 +65,266 @@ RETENTION_DAYS = 7  # الاحتفاظ بآخر 7 أيام فقط
 # ═══════════════════════════════════════════════════════════════
 
 
+def _ensure_data_dir():
+    """إنشاء مجلد data مرة واحدة بس (مش syscall مع كل حفظ)"""
+    global _data_dir_ready
+
+    if not _data_dir_ready:
+        HISTORY_FILE.parent.mkdir(exist_ok=True)
+        _data_dir_ready = True
+
+
+def _file_mtime_ns() -> Optional[int]:
+    """mtime الملف (None لو مش موجود)"""
+    try:
+        return HISTORY_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _set_history_cache(data: dict):
+    """تبديل الكاش وبناء فهرس الـ IDs"""
+    global _history_cache, _history_ids
+
+    _history_cache = data
+    _history_ids = {str(entry.get("id")) for entry in data.get("ids", [])}
+
+
+def _backfill_timestamps(data: dict):
+    """
+    إضافة "ts" (epoch) للإدخالات القديمة اللي فيها added_at بس
+    (التاريخ بيتحلل مرة واحدة عند القراءة بدل كل cleanup/بحث)
+    """
+    for entry in data.get("ids", []):
+        if "ts" not in entry:
+            try:
+                entry["ts"] = datetime.fromisoformat(entry["added_at"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                # تاريخ مش مقروء → من غير ts (بيتساب زي ما هو)
+                pass
+
+
+def _loads(raw: bytes):
+    """JSON من bytes (orjson لو متاح)"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dumps_line(entry: Dict) -> bytes:
+    """إدخال واحد كسطر JSONL"""
+    if orjson is not None:
+        return orjson.dumps(entry) + b"\n"
+    return json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _read_history_file() -> dict:
+    """
+    قراءة الملف سطر سطر (الذاكرة = سطر واحد + الإدخالات نفسها)
+
+    سطر بايظ (مثلاً append اتقطع في النص) بيتساب مع warning
+    """
+    entries = []
+    bad_lines = 0
+
+    with open(HISTORY_FILE, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entries.append(_loads(line))
+            except ValueError:
+                bad_lines += 1
+
+    if bad_lines:
+        logger.warning(f"⚠️ Skipped {bad_lines} unreadable lines in {HISTORY_FILE}")
+
+    return {"ids": entries}
+
+
+def _migrate_legacy_history():
+    """تحويل id_history.json القديم لـ JSONL (مرة واحدة)"""
+    global _legacy_checked
+
+    _legacy_checked = True
+    if HISTORY_FILE.exists() or not LEGACY_HISTORY_FILE.exists():
+        return
+
+    try:
+        data = _loads(LEGACY_HISTORY_FILE.read_bytes())
+        _backfill_timestamps(data)
+        _write_history_file(data)
+        LEGACY_HISTORY_FILE.unlink()
+        logger.info(
+            f"🔁 Migrated {len(data.get('ids', []))} IDs: "
+            f"{LEGACY_HISTORY_FILE} → {HISTORY_FILE}"
+        )
+    except Exception as e:
+        logger.error(f"❌ Error migrating {LEGACY_HISTORY_FILE}: {e}")
+
+
 def _load_history() -> dict:
     """
-    تحميل سجل الـ IDs (داخلي)
+    تحميل سجل الـ IDs (داخلي - من الذاكرة)
     """
-    if HISTORY_FILE.exists():
+    global _history_mtime_ns
+
+    if not _legacy_checked:
+        _migrate_legacy_history()
+
+    if _history_cache is not None and (_history_dirty or _append_buffer):
+        # تعديلات لسه متكتبتش → الذاكرة هي الأحدث
+        return _history_cache
+
+    mtime_ns = _file_mtime_ns()
+    if _history_cache is not None and mtime_ns == _history_mtime_ns:
+        return _history_cache
+
+    data = {"ids": []}
+    if mtime_ns is not None:
         try:
-            with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+            data = _read_history_file()
         except Exception as e:
             logger.error(f"❌ Error loading history: {e}")
-    return {"ids": []}
+        _backfill_timestamps(data)
+
+    _set_history_cache(data)
+    _history_mtime_ns = mtime_ns
+    return data
+
+
+def _atomic_write_lines(path: Path, entries: List[Dict]):
+    """
+    إعادة كتابة الملف كله بشكل atomic: ملف مؤقت + fsync + os.replace
+    (لو البوت وقع في النص الملف الأصلي يفضل سليم - يا قديم كامل يا جديد كامل)
+    """
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join(_dumps_line(entry) for entry in entries))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_history_file(data: dict):
+    """كتابة الملف كله على الديسك (compaction) وتسجيل الـ mtime الجديد"""
+    global _history_mtime_ns
+
+    _ensure_data_dir()
+    _atomic_write_lines(HISTORY_FILE, data.get("ids", []))
+    _history_mtime_ns = _file_mtime_ns()
+
+
+def _append_history_entries(entries: List[Dict]):
+    """
+    تسجيل إدخالات جديدة للكتابة في آخر الملف
+
+    لازم الإدخالات تكون اتضافت للكاش قبلها - بتتجمع في _append_buffer
+    وتتكتب مرة واحدة لما الـ buffer يكبر أو يعدي APPEND_FLUSH_INTERVAL
+    """
+    if not entries:
+        return
+
+    _append_buffer.extend(entries)
+
+    if (
+        len(_append_buffer) >= APPEND_FLUSH_MAX_ENTRIES
+        or time.monotonic() - _last_append_flush >= APPEND_FLUSH_INTERVAL
+    ):
+        _flush_append_buffer()
+
+
+def _flush_append_buffer():
+    """
+    كتابة الـ buffer في آخر الملف (write واحد - من غير إعادة كتابة السجل)
+    """
+    global _history_dirty, _history_mtime_ns, _last_append_flush
+
+    _last_append_flush = time.monotonic()
+
+    if not _append_buffer:
+        return
+
+    if _history_dirty:
+        # الديسك متأخر عن الذاكرة أصلاً → كتابة كاملة
+        flush_history()
+        return
+
+    entries = list(_append_buffer)
+    _append_buffer.clear()
+
+    try:
+        _ensure_data_dir()
+        payload = b"".join(_dumps_line(entry) for entry in entries)
+        with open(HISTORY_FILE, "a+b") as f:
+            # لو آخر سطر اتقطع (crash وسط append) نبدأ سطر جديد بدل ما نلزق فيه
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    payload = b"\n" + payload
+            f.write(payload)
+        _history_mtime_ns = _file_mtime_ns()
+    except Exception as e:
+        # الكاش فيه الإدخالات → الـ flush الجاي يكتب الملف كله
+        _history_dirty = True
+        logger.error(f"❌ Error appending to history: {e}")
 
 
 def _save_history(data: dict):
     """
     حفظ سجل الـ IDs (داخلي)
     """
+    global _history_dirty
+
+    _set_history_cache(data)
     try:
-        HISTORY_FILE.parent.mkdir(exist_ok=True)
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        _write_history_file(data)
+        _history_dirty = False
+        # الملف كله اتكتب من الكاش → الـ buffer جواه خلاص
+        _append_buffer.clear()
     except Exception as e:
+        # نفضل dirty ونحاول تاني في الحفظ/الـ flush الجاي
+        _history_dirty = True
         logger.error(f"❌ Error saving history: {e}")
 
 
+def flush_history():
+    """كتابة التعديلات المتأجلة على الديسك (لو فيه تعديلات بس)"""
+    if _history_dirty and _history_cache is not None:
+        _save_history(_history_cache)
+    elif _append_buffer:
+        _flush_append_buffer()
+
+
+atexit.register(flush_history)
+
+
+async def history_flush_worker(interval: float = APPEND_FLUSH_INTERVAL):
+    """
+    💾 كتابة الإضافات المتجمعة كل interval ثانية
+    (عشان آخر دفعة ما تستناش إضافة جديدة أو الـ shutdown)
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            flush_history()
+        except Exception as e:
+            logger.error(f"❌ Error flushing history: {e}")
+
+
 def _cleanup_old_ids(data: dict) -> dict:
     """
     حذف الإدخالات القديمة (أكتر من 7 أيام) - داخلي
     """
-    cutoff_date = datetime.now() - timedelta(days=RETENTION_DAYS)
+    cutoff = time.time() - RETENTION_DAYS * SECONDS_PER_DAY
 
-    cleaned_ids = []
-    removed_count = 0
-
-    for entry in data.get("ids", []):
-        try:
-            added_at = datetime.fromisoformat(entry["added_at"])
-            if added_at > cutoff_date:
-                cleaned_ids.append(entry)
-            else:
-                removed_count += 1
-        except:
-            # احتفظ بالإدخالات اللي مش قادرين نقرأ تاريخها
-            cleaned_ids.append(entry)
+    # احتفظ بالإدخالات اللي مش قادرين نقرأ تاريخها (من غير ts)
+    ids = data.get("ids", [])
+    cleaned_ids = [
+        entry for entry in ids if entry.get("ts") is None or entry["ts"] > cutoff
+    ]
+    removed_count = len(ids) - len(cleaned_ids)
 
     if removed_count > 0:
         logger.info(
@@ -80,6 +334,32 @@ def _cleanup_old_ids(data: dict) -> dict:
     return {"ids": cleaned_ids}
 
 
+def _maybe_cleanup(data: dict) -> dict:
+    """
+    تنظيف القديم بس لو عدّى CLEANUP_INTERVAL من آخر تنظيف
+    أو السجل عدّى CLEANUP_MAX_ENTRIES (بدل اللف على السجل كله مع كل إضافة)
+
+    لو اتمسح حاجة الملف بيتكتب من جديد من غيرها (compaction)
+    """
+    global _last_cleanup
+
+    now = time.monotonic()
+    if (
+        _last_cleanup is not None
+        and now - _last_cleanup < CLEANUP_INTERVAL
+        and len(data.get("ids", [])) <= CLEANUP_MAX_ENTRIES
+    ):
+        return data
+
+    _last_cleanup = now
+    cleaned = _cleanup_old_ids(data)
+    if len(cleaned["ids"]) == len(data.get("ids", [])):
+        return data
+
+    _save_history(cleaned)
+    return cleaned
+
+
 # ═══════════════════════════════════════════════════════════════
 # 📚 دوال عامة (Public API)
 # ═══════════════════════════════════════════════════════════════
@@ -120,21 +400,20 @@ def add_ids_to_history(ids_list: List[str]):
         # تحميل البيانات
         data = _load_history()
 
-        # تنظيف القديم
-        data = _cleanup_old_ids(data)
+        # تنظيف القديم (لو جه وقته)
+        data = _maybe_cleanup(data)
 
-        # إضافة كل الـ IDs
+        # إضافة كل الـ IDs (بعد فلترة غير الصالحة)
+        valid = [str(x) for x in ids_list if x and x not in _INVALID_IDS]
         now = datetime.now().isoformat()
-        added_count = 0
-
-        for item_id in ids_list:
-            # فلترة الـ IDs غير الصالحة
-            if item_id and item_id not in ["N/A", "pending", "api", "", None]:
-                data["ids"].append({"id": str(item_id), "added_at": now})
-                added_count += 1
+        ts = time.time()
+        entries = [{"id": v, "added_at": now, "ts": ts} for v in valid]
+        data["ids"].extend(entries)
+        _history_ids.update(valid)
+        added_count = len(valid)
 
-        # حفظ
-        _save_history(data)
+        # حفظ (append للسطور الجديدة بس)
+        _append_history_entries(entries)
 
         if added_count > 0:
             logger.info(
@@ -154,22 +433,24 @@ def add_id_to_history(id_value: str):
     Args:
         id_value: الـ ID المراد إضافته
     """
-    if not id_value or id_value in ["N/A", "pending", "api", "", None]:
+    if not id_value or id_value in _INVALID_IDS:
         return
 
     try:
         # تحميل السجل الحالي
         history = _load_history()
 
+        # تنظيف القديم (لو جه وقته)
+        history = _maybe_cleanup(history)
+
         # إضافة الـ ID
         now = datetime.now().isoformat()
-        history["ids"].append({"id": str(id_value), "added_at": now})
-
-        # تنظيف القديم
-        history = _cleanup_old_ids(history)
+        entry = {"id": str(id_value), "added_at": now, "ts": time.time()}
+        history["ids"].append(entry)
+        _history_ids.add(entry["id"])
 
-        # حفظ
-        _save_history(history)
+        # حفظ (append للسطر الجديد بس)
+        _append_history_entries([entry])
 
         logger.info(f"📜 Added ID {id_value} to history")
         logger.debug(f"📊 Total IDs in history: {len(history['ids'])}")
@@ -196,6 +477,19 @@ def check_id_exists(id_value: str) -> bool:
     """
     التحقق من وجود ID في السجل
 
+    Args:
+        id_value: الـ ID المراد البحث عنه
+
+    Returns:
+        True إذا كان موجود
+    """
+    return id_in_history(id_value)
+
+
+def id_in_history(id_value) -> bool:
+    """
+    التحقق من وجود ID في السجل (من فهرس الـ set - O(1))
+
     Args:
         id_value: الـ ID المراد البحث عنه
 
@@ -203,10 +497,9 @@ def check_id_exists(id_value: str) -> bool:
         True إذا كان موجود
     """
     try:
-        history = _load_history()
-        id_list = [entry.get("id") for entry in history.get("ids", [])]
-        return str(id_value) in id_list
-    except:
+        _load_history()
+        return str(id_value) in _history_ids
+    except Exception:
         return False
 
 
@@ -222,18 +515,13 @@ def get_recent_ids(days: int = 7) -> List[str]:
     """
     try:
         history = _load_history()
-        cutoff_date = datetime.now() - timedelta(days=days)
-
-        recent_ids = []
-        for entry in history.get("ids", []):
-            try:
-                added_at = datetime.fromisoformat(entry["added_at"])
-                if added_at > cutoff_date:
-                    recent_ids.append(entry["id"])
-            except:
-                continue
+        cutoff = time.time() - days * SECONDS_PER_DAY
 
-        return recent_ids
+        return [
+            entry["id"]
+            for entry in history.get("ids", [])
+            if entry.get("ts") is not None and entry["ts"] > cutoff
+        ]
 
     except Exception as e:
         logger.error(f"❌ Error getting recent IDs: {e}")
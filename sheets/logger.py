@@ -5,7 +5,9 @@
 نظام لوج أسبوعي (السبت → الجمعة)
 """
 
+import atexit
 import logging
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -29,6 +31,9 @@ class WeeklyLogger:
         self.log_dir.mkdir(exist_ok=True)
         self.current_file = None
         self.current_week_start = None
+        self._fh = None  # الملف بيفضل مفتوح طول الأسبوع (مش open/close مع كل سطر)
+        self._next_week_ts = 0.0  # بداية الأسبوع الجاي (epoch) - قبلها مفيش تغيير
+        atexit.register(self.close)
     
     def _get_week_start(self) -> datetime:
         """
@@ -66,20 +71,43 @@ class WeeklyLogger:
             message: الرسالة المراد كتابتها
         """
         try:
-            # التحقق من تغيير الأسبوع
-            week_start = self._get_week_start()
-            
-            if self.current_week_start != week_start:
-                self.current_week_start = week_start
-                self.current_file = self._get_log_filename()
-                logger.info(f"📝 New log file: {self.current_file}")
+            # التحقق من تغيير الأسبوع (بس لما نوصل لبداية الأسبوع الجاي)
+            if time.time() >= self._next_week_ts:
+                self._roll_week()
             
             # كتابة الرسالة
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
             log_line = f"[{timestamp}] {message}\n"
             
-            with open(self.current_file, "a", encoding="utf-8") as f:
-                f.write(log_line)
+            self._fh.write(log_line)
                 
         except Exception as e:
             logger.error(f"❌ Error writing to log: {e}")
+            # نفتح الملف تاني مع السطر الجاي
+            self.close()
+            self.current_week_start = None
+            self._next_week_ts = 0.0
+
+    def _roll_week(self):
+        """تحديد ملف الأسبوع الحالي وفتحه لو الأسبوع اتغير"""
+        week_start = self._get_week_start()
+        self._next_week_ts = (week_start + timedelta(days=7)).timestamp()
+
+        if self.current_week_start != week_start or self._fh is None:
+            self.current_week_start = week_start
+            self.current_file = self._get_log_filename()
+            logger.info(f"📝 New log file: {self.current_file}")
+
+            # قفل ملف الأسبوع اللي فات وفتح الجديد
+            self.close()
+            # buffering=1: line-buffered → كل سطر بيوصل الملف على طول
+            self._fh = open(self.current_file, "a", encoding="utf-8", buffering=1)
+
+    def close(self):
+        """قفل ملف اللوج المفتوح (لو فيه)"""
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
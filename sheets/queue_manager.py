@@ -2,134 +2,523 @@
 # -*- coding: utf-8 -*-
 """
 📦 Queue Manager
-إدارة الـ 3 ملفات JSON (pending, retry, failed)
+إدارة الـ 3 queues (pending, retry, failed)
+
+كل queue ملف JSONL append-only في data/ (pending.jsonl, retry.jsonl, failed.jsonl):
+- إضافة = سطر JSON جديد في آخر الملف
+- مسح = سطر tombstone: {"_del": [emails...]}
+- الملف بيتضغط (إعادة كتابة بالعناصر الحية بس) لما السطور الميتة تبقى أكتر من النص
 """
 
+import asyncio
 import json
 import logging
+import os
+import threading
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+# ⚡ orjson أسرع بكتير في القراءة والكتابة - اختياري
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 DATA_DIR = Path("data")
 
+# 📥 الأسماء المنطقية للـ queues (الاسم اللي الـ workers بيستخدموه)
+PENDING_FILE = "pending.json"
+RETRY_FILE = "retry.json"
+FAILED_FILE = "failed.json"
+
+# 🧱 الإضافات الجديدة لـ pending كانت بتتكتب في pending.jsonl وتتنقل لـ
+# pending.jsonl.draining قبل الدمج - لو لسه موجود من تشغيل قديم بيتدمج مرة واحدة
+PENDING_LOG_DRAINING = DATA_DIR / "pending.jsonl.draining"
+
+# 🗜️ الضغط: بعد ما الملف يعدي COMPACT_MIN_LINES سطر ونسبة الميت تعدي النص
+COMPACT_MIN_LINES = 200
+COMPACT_DEAD_RATIO = 0.5
+
+TOMBSTONE_KEY = "_del"
+
+# 💽 fsync وقت إعادة كتابة الملف (الضغط/save_queue): failed بس افتراضياً
+# pending/retry بيتعادوا كتير والـ append نفسه من غير fsync أصلاً، فالـ fsync
+# هناك بيضاعف وقت الكتابة من غير ضمان حقيقي - os.replace لوحده بيمنع الملف
+# المقطوع (يا القديم كامل يا الجديد كامل)
+_fsync_queues = {FAILED_FILE}
+
+_data_dir_ready = False
+
+# 🧠 حالة كل queue في الذاكرة: filename → {"ino", "offset", "entries", "lines"}
+# offset = لحد فين الملف اتقرا → التغيير الجاي بيتقرا من الـ offset بس (مش الملف كله)
+_queue_state: Dict[str, Dict] = {}
+
+# 📜 الملفات القديمة (JSON كامل) اتدمجت في الـ JSONL خلاص
+_migrated: set = set()
+
+# 🔒 الـ workers بيشغلوا العمليات دي في threads (asyncio.to_thread)
+# أي قراءة/كتابة لملف queue لازم تمسك الـ lock (RLock: العمليات بتنادي بعض)
+_queue_lock = threading.RLock()
+
+# 🔔 الـ pending worker بيستنى على الـ Event ده بدل polling
+# الإضافة ممكن تيجي من thread (asyncio.to_thread) → set عن طريق call_soon_threadsafe
+_pending_event: Optional[asyncio.Event] = None
+_pending_loop: Optional[asyncio.AbstractEventLoop] = None
+
+if orjson is not None:
+    _loads = orjson.loads
+
+    def _dumps_line(obj) -> bytes:
+        return orjson.dumps(obj) + b"\n"
+
+else:
+    _loads = json.loads
+
+    def _dumps_line(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _ensure_data_dir():
+    """إنشاء مجلد data مرة واحدة بس (مش syscall مع كل إضافة)"""
+    global _data_dir_ready
+
+    if not _data_dir_ready:
+        DATA_DIR.mkdir(exist_ok=True)
+        _data_dir_ready = True
+
+
+def _log_path(filename: str) -> Path:
+    """pending.json → data/pending.jsonl"""
+    return DATA_DIR / f"{Path(filename).stem}.jsonl"
+
+
+def _apply_record(entries: List[Dict], record: Dict):
+    """
+    تطبيق سطر واحد على العناصر الحية
+
+    tombstone بيمسح أول ظهور لكل إيميل (مرة لكل تكرار في الـ tombstone):
+    الدفعة دايماً من أول الـ queue، فاللي اتضاف بنفس الإيميل أثناء ما الدفعة
+    بتتبعت بيفضل موجود
+    """
+    deleted = record.get(TOMBSTONE_KEY)
+    if deleted is None:
+        entries.append(record)
+        return
+
+    remaining = Counter(deleted)
+    kept = []
+    for item in entries:
+        email = item.get("email")
+        if remaining[email] > 0:
+            remaining[email] -= 1
+            continue
+        kept.append(item)
+    entries[:] = kept
+
+
+def _parse_lines(filename: str, chunk: bytes, entries: List[Dict]) -> int:
+    """فك سطور JSONL وتطبيقها - بيرجع عدد السطور"""
+    lines = 0
+    for line in chunk.split(b"\n"):
+        line = line.strip()
+        if not line:
+            continue
+        lines += 1
+        try:
+            record = _loads(line)
+        except ValueError as e:
+            logger.error(f"❌ Skipping bad line in {_log_path(filename).name}: {e}")
+            continue
+        if isinstance(record, dict):
+            _apply_record(entries, record)
+    return lines
+
+
+def set_fsync_queues(filenames):
+    """
+    تحديد الـ queues اللي بتعمل fsync مع إعادة الكتابة
+
+    Args:
+        filenames: أسماء الـ queues (مثل: ["failed.json"])
+    """
+    global _fsync_queues
+    _fsync_queues = set(filenames)
+
+
+def _atomic_write_lines(path: Path, payload: bytes, fsync: bool = True):
+    """✍️ ملف مؤقت (+ fsync) + os.replace: الملف يا قديم كامل يا جديد كامل"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _migrate_legacy(filename: str):
+    """
+    📜 دمج الملفات القديمة (data/<name>.json + pending.jsonl.draining) في الـ JSONL
+    مرة واحدة بس - الترتيب: الـ JSON القديم ← draining ← الـ JSONL الحالي
+    """
+    if filename in _migrated:
+        return
+    _migrated.add(filename)
+
+    legacy = DATA_DIR / filename
+    draining = PENDING_LOG_DRAINING if filename == PENDING_FILE else None
+    sources = [p for p in (legacy, draining) if p is not None and p.exists()]
+    if not sources:
+        return
+
+    parts = []
+    try:
+        if legacy.exists() and legacy.stat().st_size:
+            with open(legacy, "rb") as f:
+                items = _loads(f.read()).get("emails", [])
+            parts.append(b"".join(_dumps_line(item) for item in items))
+
+        for path in (draining, _log_path(filename)):
+            if path is not None and path.exists():
+                with open(path, "rb") as f:
+                    data = f.read()
+                if data and not data.endswith(b"\n"):
+                    data += b"\n"
+                parts.append(data)
+
+        _ensure_data_dir()
+        _atomic_write_lines(_log_path(filename), b"".join(parts))
+        for path in sources:
+            path.unlink()
+
+        logger.info(f"📦 Migrated {filename} to {_log_path(filename).name}")
+    except (OSError, ValueError, AttributeError) as e:
+        logger.error(f"❌ Error migrating {filename}: {e}")
+
+
+def _read_state(filename: str) -> Dict:
+    """
+    حالة الـ queue بعد آخر تغيير في الملف
+    (لازم يتنادى والـ lock ممسوك)
+
+    نفس الملف (inode) واتكبر بس → بنقرا الجزء الجديد من الـ offset
+    غير كده (اتضغط/اتمسح/اتبدل) → قراءة كاملة
+    """
+    _migrate_legacy(filename)
+    path = _log_path(filename)
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        state = {"ino": None, "offset": 0, "entries": [], "lines": 0}
+        _queue_state[filename] = state
+        return state
+
+    state = _queue_state.get(filename)
+    if (
+        state is None
+        or state["ino"] != st.st_ino
+        or st.st_size < state["offset"]
+    ):
+        state = {"ino": st.st_ino, "offset": 0, "entries": [], "lines": 0}
+        _queue_state[filename] = state
+
+    if st.st_size == state["offset"]:
+        return state
+
+    with open(path, "rb") as f:
+        f.seek(state["offset"])
+        chunk = f.read()
+
+    # سطر ناقص في الآخر (كتابة لسه ما خلصتش) → يستنى للقراءة الجاية
+    end = chunk.rfind(b"\n") + 1
+    if end:
+        state["lines"] += _parse_lines(filename, chunk[:end], state["entries"])
+        state["offset"] += end
+
+    return state
+
+
+def _append_records(filename: str, records: List[Dict]):
+    """كتابة سطور في آخر الملف (O(الإضافة) - من غير قراءة أو إعادة كتابة)"""
+    _ensure_data_dir()
+    _migrate_legacy(filename)
+    payload = b"".join(_dumps_line(record) for record in records)
+
+    with open(_log_path(filename), "a+b") as f:
+        # لو آخر سطر ناقص (وقف في النص) نبدأ سطر جديد بدل ما نلزق فيه
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                payload = b"\n" + payload
+        f.write(payload)
+
+
+def _maybe_compact(filename: str):
+    """🗜️ إعادة كتابة الملف بالعناصر الحية بس لما الميت يبقى أكتر من النص"""
+    state = _read_state(filename)
+    lines = state["lines"]
+    dead = lines - len(state["entries"])
+
+    if lines >= COMPACT_MIN_LINES and dead / lines > COMPACT_DEAD_RATIO:
+        if save_queue(filename, {"emails": state["entries"]}):
+            logger.info(f"🗜️ Compacted {filename}: {lines} → {lines - dead} lines")
+
 
 def load_queue(filename: str) -> Dict:
     """
-    تحميل ملف queue
-    
+    تحميل queue
+
     Args:
-        filename: اسم الملف (مثل: pending.json)
-    
+        filename: اسم الـ queue (مثل: pending.json)
+
     Returns:
         Dict مع key "emails" يحتوي على list
     """
-    file_path = DATA_DIR / filename
-    
-    if file_path.exists():
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"❌ Error loading {filename}: {e}")
-    
+    try:
+        with _queue_lock:
+            state = _read_state(filename)
+            # نسخ عشان تعديل المتصل (attempts مثلاً) ما يبوظش الحالة اللي في الذاكرة
+            return {"emails": [dict(item) for item in state["entries"]]}
+    except OSError as e:
+        _queue_state.pop(filename, None)
+        logger.error(f"❌ Error loading {filename}: {e}")
+
     return {"emails": []}
 
 
-def save_queue(filename: str, data: Dict):
+def queue_may_have_items(filename: str) -> bool:
+    """
+    ⚡ فحص سريع من غير lock ولا قراءة: False بس لو الـ queue فاضي في الذاكرة
+    والملف ما اتغيرش من آخر قراءة (stat واحد - ينفع من الـ event loop على طول)
+    """
+    state = _queue_state.get(filename)
+    if state is None or state["entries"] or filename not in _migrated:
+        return True
+
+    try:
+        st = os.stat(_log_path(filename))
+    except FileNotFoundError:
+        return state["ino"] is not None
+    except OSError:
+        return True
+
+    return st.st_ino != state["ino"] or st.st_size != state["offset"]
+
+
+def save_queue(filename: str, data: Dict) -> bool:
     """
-    حفظ ملف queue
-    
+    حفظ queue كامل (إعادة كتابة الملف بالعناصر دي بس)
+
     Args:
-        filename: اسم الملف
+        filename: اسم الـ queue
         data: البيانات للحفظ
+
+    Returns:
+        True إذا تم الحفظ بنجاح
     """
-    DATA_DIR.mkdir(exist_ok=True)
-    file_path = DATA_DIR / filename
-    
+    _ensure_data_dir()
+    path = _log_path(filename)
+    entries = list(data.get("emails", []))
+
+    with _queue_lock:
+        try:
+            _migrate_legacy(filename)
+            _atomic_write_lines(
+                path,
+                b"".join(_dumps_line(item) for item in entries),
+                fsync=filename in _fsync_queues,
+            )
+
+            st = os.stat(path)
+            _queue_state[filename] = {
+                "ino": st.st_ino,
+                "offset": st.st_size,
+                "entries": [dict(item) for item in entries],
+                "lines": len(entries),
+            }
+            return True
+        except Exception as e:
+            _queue_state.pop(filename, None)
+            logger.error(f"❌ Error saving {filename}: {e}")
+            return False
+
+
+def _append_to_queue(filename: str, records: List[Dict]) -> bool:
+    """إضافة سطور لـ queue (الأخطاء بتتسجل بس - زي save_queue)"""
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"❌ Error saving {filename}: {e}")
+        with _queue_lock:
+            _append_records(filename, records)
+        return True
+    except OSError as e:
+        logger.error(f"❌ Error appending to {filename}: {e}")
+        return False
 
 
 def move_to_retry(email_data: Dict):
     """
     نقل من pending إلى retry
-    
+
     Args:
         email_data: بيانات الإيميل
     """
     # تحديث عدد المحاولات
     email_data["attempts"] = email_data.get("attempts", 0) + 1
     email_data["last_attempt"] = datetime.now().isoformat()
-    
+
     # إضافة لـ retry
-    retry_data = load_queue("retry.json")
-    retry_data["emails"].append(email_data)
-    save_queue("retry.json", retry_data)
-    
+    _append_to_queue(RETRY_FILE, [email_data])
+
     logger.info(f"📝 Moved {email_data['email']} to retry queue (attempt {email_data['attempts']})")
 
 
 def move_to_failed(email_data: Dict):
     """
     نقل من retry إلى failed
-    
+
     Args:
         email_data: بيانات الإيميل
     """
     email_data["failed_at"] = datetime.now().isoformat()
-    
+
     # إضافة لـ failed
-    failed_data = load_queue("failed.json")
-    failed_data["emails"].append(email_data)
-    save_queue("failed.json", failed_data)
-    
+    _append_to_queue(FAILED_FILE, [email_data])
+
     logger.warning(f"❌ Moved {email_data['email']} to failed queue")
 
 
+def move_many_to_retry(email_data_list: List[Dict]):
+    """
+    نقل عدة إيميلات لـ retry مرة واحدة (كتابة واحدة في آخر الملف للدفعة كلها)
+
+    Args:
+        email_data_list: List من بيانات الإيميلات
+    """
+    if not email_data_list:
+        return
+
+    now = datetime.now().isoformat()
+    for email_data in email_data_list:
+        email_data["attempts"] = email_data.get("attempts", 0) + 1
+        email_data["last_attempt"] = now
+
+    _append_to_queue(RETRY_FILE, email_data_list)
+
+    logger.info(f"📝 Moved {len(email_data_list)} emails to retry queue")
+
+
+def move_many_to_failed(email_data_list: List[Dict]):
+    """
+    نقل عدة إيميلات لـ failed مرة واحدة (كتابة واحدة في آخر الملف للدفعة كلها)
+
+    Args:
+        email_data_list: List من بيانات الإيميلات
+    """
+    if not email_data_list:
+        return
+
+    now = datetime.now().isoformat()
+    for email_data in email_data_list:
+        email_data["failed_at"] = now
+
+    _append_to_queue(FAILED_FILE, email_data_list)
+
+    logger.warning(f"❌ Moved {len(email_data_list)} emails to failed queue")
+
+
+def watch_pending() -> asyncio.Event:
+    """
+    Event بيتعمله set مع كل إضافة لـ pending
+    (لازم يتنادى من جوه الـ event loop بتاع الـ worker)
+    """
+    global _pending_event, _pending_loop
+
+    _pending_event = asyncio.Event()
+    _pending_loop = asyncio.get_running_loop()
+    return _pending_event
+
+
+def _notify_pending():
+    """صحّي الـ pending worker (آمن من أي thread)"""
+    if _pending_loop is None:
+        return
+    try:
+        _pending_loop.call_soon_threadsafe(_pending_event.set)
+    except RuntimeError:
+        # الـ loop اتقفل (shutdown)
+        pass
+
+
+def append_to_pending(entry: Dict):
+    """
+    إضافة إيميل لـ pending كسطر JSON واحد (O(1) - بدون قراءة الملف)
+
+    Args:
+        entry: {"email": str, "id": str, "added_at": str}
+    """
+    with _queue_lock:
+        _append_records(PENDING_FILE, [entry])
+
+    _notify_pending()
+
+
 def get_pending_batch() -> List[Dict]:
     """
     الحصول على batch من pending
-    
+
     Returns:
         List من الإيميلات
     """
-    data = load_queue("pending.json")
+    data = load_queue(PENDING_FILE)
     return data.get("emails", [])
 
 
 def get_retry_batch() -> List[Dict]:
     """
     الحصول على batch من retry
-    
+
     Returns:
         List من الإيميلات
     """
-    data = load_queue("retry.json")
+    data = load_queue(RETRY_FILE)
     return data.get("emails", [])
 
 
 def clear_batch(filename: str, processed_emails: List[str]):
     """
-    مسح الإيميلات اللي اتعالجت بنجاح
-    
+    مسح الإيميلات اللي اتعالجت بنجاح (سطر tombstone واحد - مش إعادة كتابة)
+
     Args:
-        filename: اسم الملف
+        filename: اسم الـ queue
         processed_emails: List من الإيميلات اللي تمت معالجتها
     """
-    data = load_queue(filename)
-    
-    # إزالة الإيميلات الناجحة
-    data["emails"] = [
-        item for item in data["emails"]
-        if item.get("email") not in processed_emails
-    ]
-    
-    save_queue(filename, data)
-    
+    requeue_batch(filename, processed_emails, [])
+
     logger.info(f"✅ Cleared {len(processed_emails)} emails from {filename}")
+
+
+def requeue_batch(filename: str, processed_emails: List[str], items: List[Dict]):
+    """
+    مسح دفعة وإرجاع نسخ محدثة منها لآخر نفس الـ queue (كتابة واحدة)
+
+    Args:
+        filename: اسم الـ queue
+        processed_emails: إيميلات الدفعة القديمة
+        items: العناصر المحدثة اللي ترجع للـ queue
+    """
+    if not processed_emails and not items:
+        return
+
+    records = [{TOMBSTONE_KEY: list(processed_emails)}] if processed_emails else []
+    records.extend(items)
+
+    with _queue_lock:
+        if _append_to_queue(filename, records):
+            try:
+                _maybe_compact(filename)
+            except OSError as e:
+                logger.error(f"❌ Error compacting {filename}: {e}")
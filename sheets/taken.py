@@ -9,11 +9,22 @@
 import asyncio
 import json
 import logging
+import os
 import random
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+# ⚡ orjson أسرع بكتير في القراءة والكتابة - اختياري
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .id_history import HISTORY_FILE as ID_HISTORY_FILE
+from .id_history import id_in_history
+
 logger = logging.getLogger(__name__)
 
 # ═══════════════════════════════════════════════════════════════
@@ -21,7 +32,22 @@ logger = logging.getLogger(__name__)
 # ═══════════════════════════════════════════════════════════════
 
 TAKEN_QUEUE_FILE = Path("data/Taken.json")
-ID_HISTORY_FILE = Path("data/id_history.json")
+
+# 🔒 الـ worker بيمسح من thread، والإضافة بتيجي من الـ event loop
+# فأي load → تعديل → save لازم يتعمل تحت القفل عشان ما يضيعش تعديل
+_taken_lock = threading.Lock()
+
+# 💤 الـ Queue فاضية → الانتظار بيزيد أسياً لحد 5 دقايق
+IDLE_BACKOFF_MAX = 300  # ثانية
+
+# 🔔 بيتعمله set مع كل إضافة → الـ worker يصحى على طول بدل ما يكمل الـ backoff
+_taken_available = asyncio.Event()
+
+_data_dir_ready = False
+
+# 🧠 نسخة في الذاكرة من Taken.json (ID → عنصر): الـ overwrite/المسح O(1)
+_taken_cache: Optional[Dict[str, Dict]] = None
+_taken_mtime_ns: Optional[int] = None  # mtime الملف وقت آخر قراءة/كتابة
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -29,28 +55,99 @@ ID_HISTORY_FILE = Path("data/id_history.json")
 # ═══════════════════════════════════════════════════════════════
 
 
-def load_taken_queue() -> List[Dict]:
-    """تحميل queue الكوينز المسحوبة"""
+def _ensure_data_dir():
+    """إنشاء مجلد data مرة واحدة بس (مش syscall مع كل حفظ)"""
+    global _data_dir_ready
+
+    if not _data_dir_ready:
+        TAKEN_QUEUE_FILE.parent.mkdir(exist_ok=True)
+        _data_dir_ready = True
+
+
+def _atomic_write_json(path: Path, data: Dict):
+    """
+    كتابة JSON بشكل atomic: ملف مؤقت + fsync + os.replace
+    (لو البوت وقع في النص الملف الأصلي يفضل سليم - يا قديم كامل يا جديد كامل)
+    """
+    # من غير indent: الملف بيتكتب مع كل تعديل فالحجم والسرعة أهم
+    if orjson is not None:
+        payload = orjson.dumps(data)
+    else:
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _file_mtime_ns() -> Optional[int]:
+    """mtime الملف (None لو مش موجود)"""
+    try:
+        return TAKEN_QUEUE_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _read_taken_file() -> List[Dict]:
+    """قراءة Taken.json من الديسك"""
     if TAKEN_QUEUE_FILE.exists():
         try:
-            with open(TAKEN_QUEUE_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data.get("items", [])
+            if orjson is not None:
+                data = orjson.loads(TAKEN_QUEUE_FILE.read_bytes())
+            else:
+                with open(TAKEN_QUEUE_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            return data.get("items", [])
         except Exception as e:
             logger.error(f"❌ Error loading Taken.json: {e}")
     return []
 
 
-def save_taken_queue(items: List[Dict]):
-    """حفظ queue الكوينز المسحوبة"""
+def _load_taken_cache() -> Dict[str, Dict]:
+    """
+    الـ queue في الذاكرة كـ dict (ID → عنصر) - لازم يتنادى تحت _taken_lock
+
+    بيعيد القراءة بس لو الملف اتعدل من بره (mtime اتغير)
+    """
+    global _taken_cache, _taken_mtime_ns
+
+    mtime_ns = _file_mtime_ns()
+    if _taken_cache is None or mtime_ns != _taken_mtime_ns:
+        _taken_cache = {item.get("id"): item for item in _read_taken_file()}
+        _taken_mtime_ns = mtime_ns
+    return _taken_cache
+
+
+def _save_taken_cache():
+    """كتابة الـ queue من الذاكرة على الديسك - لازم يتنادى تحت _taken_lock"""
+    global _taken_mtime_ns
+
     try:
-        TAKEN_QUEUE_FILE.parent.mkdir(exist_ok=True)
-        with open(TAKEN_QUEUE_FILE, "w", encoding="utf-8") as f:
-            json.dump({"items": items}, f, indent=2, ensure_ascii=False)
+        _ensure_data_dir()
+        _atomic_write_json(TAKEN_QUEUE_FILE, {"items": list(_taken_cache.values())})
+        _taken_mtime_ns = _file_mtime_ns()
     except Exception as e:
         logger.error(f"❌ Error saving Taken.json: {e}")
 
 
+def load_taken_queue() -> List[Dict]:
+    """تحميل queue الكوينز المسحوبة"""
+    with _taken_lock:
+        return list(_load_taken_cache().values())
+
+
+def save_taken_queue(items: List[Dict]):
+    """حفظ queue الكوينز المسحوبة"""
+    global _taken_cache
+
+    with _taken_lock:
+        _taken_cache = {item.get("id"): item for item in items}
+        _save_taken_cache()
+
+
 def add_to_taken_queue(
     account_id: str, email: str, status: str, taken_value: str
 ) -> bool:
@@ -67,11 +164,6 @@ def add_to_taken_queue(
         True إذا تمت الإضافة بنجاح
     """
     try:
-        items = load_taken_queue()
-
-        # تجنب التكرار - نسجل آخر قيمة فقط (overwrite)
-        items = [item for item in items if item.get("id") != account_id]
-
         new_item = {
             "id": account_id,
             "email": email,
@@ -80,8 +172,16 @@ def add_to_taken_queue(
             "added_at": datetime.now().isoformat(),
         }
 
-        items.append(new_item)
-        save_taken_queue(items)
+        with _taken_lock:
+            items = _load_taken_cache()
+
+            # تجنب التكرار - نسجل آخر قيمة فقط (overwrite - O(1))
+            # pop الأول عشان العنصر يتنقل لآخر الـ queue زي الأول
+            items.pop(account_id, None)
+            items[account_id] = new_item
+            _save_taken_cache()
+
+        _taken_available.set()
 
         logger.info(
             f"📝 Added to Taken queue: {email} (ID: {account_id}, Status: {status}, Taken: {taken_value})"
@@ -96,15 +196,13 @@ def add_to_taken_queue(
 def clear_taken_entry(account_id: str):
     """مسح عملية من الـ queue (نجاح أو فشل)"""
     try:
-        items = load_taken_queue()
-        original_count = len(items)
+        with _taken_lock:
+            items = _load_taken_cache()
 
-        items = [item for item in items if item.get("id") != account_id]
-
-        if len(items) < original_count:
-            save_taken_queue(items)
-            logger.info(f"🗑️ Cleared from Taken queue: ID {account_id}")
-            return True
+            if items.pop(account_id, None) is not None:
+                _save_taken_cache()
+                logger.info(f"🗑️ Cleared from Taken queue: ID {account_id}")
+                return True
 
         return False
 
@@ -113,6 +211,41 @@ def clear_taken_entry(account_id: str):
         return False
 
 
+def clear_taken_entries(processed: Dict[str, Optional[str]]) -> int:
+    """
+    مسح عدة عمليات من الـ queue مرة واحدة (حفظ واحد للدفعة كلها)
+
+    Args:
+        processed: ID → added_at بتاع العنصر اللي اتعالج
+            (لو العنصر اتبدل بعد القراءة الـ added_at بيختلف → بيفضل في الـ queue)
+
+    Returns:
+        عدد العناصر اللي اتمسحت
+    """
+    if not processed:
+        return 0
+
+    try:
+        with _taken_lock:
+            items = _load_taken_cache()
+            removed = 0
+            for account_id, added_at in processed.items():
+                item = items.get(account_id)
+                if item is not None and item.get("added_at") == added_at:
+                    del items[account_id]
+                    removed += 1
+
+            if removed:
+                _save_taken_cache()
+                logger.info(f"🗑️ Cleared {removed} items from Taken queue")
+
+        return removed
+
+    except Exception as e:
+        logger.error(f"❌ Error clearing from Taken queue: {e}")
+        return 0
+
+
 # ═══════════════════════════════════════════════════════════════
 # 🔍 التحقق من ID History
 # ═══════════════════════════════════════════════════════════════
@@ -120,7 +253,7 @@ def clear_taken_entry(account_id: str):
 
 def check_id_in_history(account_id: str) -> bool:
     """
-    التحقق من وجود ID في id_history.json
+    التحقق من وجود ID في id_history
 
     Args:
         account_id: ID الحساب
@@ -129,21 +262,16 @@ def check_id_in_history(account_id: str) -> bool:
         True إذا كان ID موجود
     """
     try:
+        # البحث من فهرس id_history في الذاكرة (O(1) بدل اللف على كل الإدخالات)
+        if id_in_history(account_id):
+            return True
+
         if not ID_HISTORY_FILE.exists():
-            logger.warning("⚠️ id_history.json not found")
+            logger.warning(f"⚠️ {ID_HISTORY_FILE.name} not found")
             return False
 
-        with open(ID_HISTORY_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            ids_list = data.get("ids", [])
-
-            # البحث عن ID
-            for entry in ids_list:
-                if str(entry.get("id")) == str(account_id):
-                    return True
-
-            logger.warning(f"⚠️ ID {account_id} not in id_history.json")
-            return False
+        logger.warning(f"⚠️ ID {account_id} not in {ID_HISTORY_FILE.name}")
+        return False
 
     except Exception as e:
         logger.error(f"❌ Error checking ID history: {e}")
@@ -239,6 +367,40 @@ def find_row_by_id(sheets_api, account_id: str) -> Optional[int]:
         return None
 
 
+def build_id_row_index(sheets_api) -> Dict[str, int]:
+    """
+    قراءة عمود Z مرة واحدة وبناء فهرس {ID: رقم الصف}
+    (بدل قراءة العمود كله والبحث فيه لكل عنصر)
+
+    Args:
+        sheets_api: Google Sheets API instance
+
+    Returns:
+        dict من الـ ID لرقم الصف (1-based) - فاضي لو حصل خطأ
+    """
+    try:
+        column_range = f"{sheets_api.sheet_name}!Z:Z"
+        result = (
+            sheets_api.service.spreadsheets()
+            .values()
+            .get(spreadsheetId=sheets_api.spreadsheet_id, range=column_range)
+            .execute()
+        )
+
+        index: Dict[str, int] = {}
+        for idx, row in enumerate(result.get("values", []), start=1):
+            if row:
+                # أول صف للـ ID هو اللي بيكسب (زي find_row_by_id)
+                index.setdefault(str(row[0]).strip(), idx)
+
+        logger.info(f"🗂️ Indexed {len(index)} IDs from column Z")
+        return index
+
+    except Exception as e:
+        logger.error(f"❌ Error reading column Z: {e}")
+        return {}
+
+
 # ═══════════════════════════════════════════════════════════════
 # ✏️ تحديث الخلية في Google Sheet
 # ═══════════════════════════════════════════════════════════════
@@ -281,6 +443,49 @@ def update_sheet_cell(
         return False, str(e)
 
 
+def batch_update_sheet_cells(
+    sheets_api, updates: List[Tuple[str, str]]
+) -> Tuple[bool, str]:
+    """
+    تحديث عدة خلايا في طلب واحد (values().batchUpdate)
+
+    Args:
+        sheets_api: Google Sheets API instance
+        updates: List من (الخلية مثل "C5", القيمة)
+
+    Returns:
+        (success: bool, message: str)
+    """
+    if not updates:
+        return True, "Nothing to update"
+
+    try:
+        body = {
+            "valueInputOption": "USER_ENTERED",
+            "data": [
+                {"range": f"{sheets_api.sheet_name}!{cell}", "values": [[value]]}
+                for cell, value in updates
+            ],
+        }
+
+        logger.info(f"✏️ Batch updating {len(updates)} cells")
+
+        result = (
+            sheets_api.service.spreadsheets()
+            .values()
+            .batchUpdate(spreadsheetId=sheets_api.spreadsheet_id, body=body)
+            .execute()
+        )
+
+        updated = result.get("totalUpdatedCells", len(updates))
+        logger.info(f"✅ Successfully updated {updated} cells")
+        return True, f"Updated {updated} cells"
+
+    except Exception as e:
+        logger.error(f"❌ Error batch updating {len(updates)} cells: {e}")
+        return False, str(e)
+
+
 # ═══════════════════════════════════════════════════════════════
 # ⚙️ المعالج الرئيسي (Worker)
 # ═══════════════════════════════════════════════════════════════
@@ -291,12 +496,14 @@ async def taken_worker(config: Dict, sheets_api):
     🔄 Worker معالجة الكوينز المسحوبة
 
     التدفق:
-    1. قراءة Taken.json كل 1-10 ثواني
+    1. قراءة Taken.json كل 1-10 ثواني (ولو فاضية: backoff أسي لحد 5 دقايق
+       والإضافة الجديدة بتصحّي الـ worker على طول)
     2. لكل عنصر:
-       - التحقق من id_history.json
-       - البحث في Sheet (عمود Z)
-       - تحديث العمود المناسب (C أو F)
-       - مسح من Taken.json (نجح أو فشل)
+       - التحقق من id_history
+       - البحث في Sheet (فهرس عمود Z - قراءة واحدة للدفعة)
+       - تجهيز تحديث العمود المناسب (C أو F)
+    3. تحديث كل الخلايا في طلب batchUpdate واحد
+    4. مسح كل العناصر اللي اتعالجت من Taken.json مرة واحدة (نجح أو فشل)
 
     Args:
         config: إعدادات التطبيق
@@ -322,18 +529,41 @@ async def taken_worker(config: Dict, sheets_api):
         f"AMOUNT_TAKEN→{amount_taken_col}, DISABLED→{disabled_col})"
     )
 
+    idle_cycles = 0
+
     while True:
         try:
-            # قراءة Queue
-            items = load_taken_queue()
+            # أي إضافة أثناء القراءة هتعمل set تاني → مش هتضيع
+            _taken_available.clear()
+
+            # قراءة Queue (في thread عشان الـ event loop ما يقفش ورا الديسك)
+            items = await asyncio.to_thread(load_taken_queue)
 
             if not items:
-                # لا يوجد شيء للمعالجة
-                await asyncio.sleep(random.uniform(interval_min, interval_max))
+                # لا يوجد شيء للمعالجة → backoff أسي (أو لحد ما حاجة تتضاف)
+                idle_sleep = min(interval_max * 2**idle_cycles, IDLE_BACKOFF_MAX)
+                idle_cycles = min(idle_cycles + 1, 16)
+                try:
+                    await asyncio.wait_for(_taken_available.wait(), idle_sleep)
+                except asyncio.TimeoutError:
+                    pass
                 continue
 
+            idle_cycles = 0
+
             logger.info(f"📋 Processing {len(items)} items from Taken queue")
 
+            # العناصر اللي خلصت (نجحت أو فشلت) → بتتمسح مرة واحدة بعد الدفعة
+            # ID → added_at عشان لو العنصر اتبدل أثناء الدفعة الجديد ما يتمسحش
+            processed: Dict[str, Optional[str]] = {}
+
+            # فهرس عمود Z بيتقري مرة واحدة للدفعة (أول ما نحتاجه)
+            row_index: Optional[Dict[str, int]] = None
+
+            # التحديثات بتتجمع وتتبعت في طلب واحد بعد اللوب
+            updates: List[Tuple[str, str]] = []
+            updated_items: List[Tuple[str, str, str]] = []  # (cell, email, status)
+
             for item in items:
                 try:
                     account_id = item.get("id", "")
@@ -345,20 +575,24 @@ async def taken_worker(config: Dict, sheets_api):
                         f"🔄 Processing: {email} (ID: {account_id}, Status: {status})"
                     )
 
-                    # ✅ الخطوة 1: التحقق من id_history.json
+                    # ✅ الخطوة 1: التحقق من id_history
                     if not check_id_in_history(account_id):
                         logger.warning(f"⚠️ ID {account_id} not in history - skipping")
-                        clear_taken_entry(account_id)
+                        processed[account_id] = item.get("added_at")
                         continue
 
                     # ✅ الخطوة 2: البحث في Sheet
-                    row_number = find_row_by_id(sheets_api, account_id)
+                    if row_index is None:
+                        row_index = await sheets_api.call(
+                            build_id_row_index, sheets_api
+                        )
+                    row_number = row_index.get(str(account_id).strip())
 
                     if not row_number:
                         logger.warning(
                             f"⚠️ ID {account_id} not found in Sheet - skipping"
                         )
-                        clear_taken_entry(account_id)
+                        processed[account_id] = item.get("added_at")
                         continue
 
                     # ✅ الخطوة 3: تحويل الكوينز
@@ -371,31 +605,37 @@ async def taken_worker(config: Dict, sheets_api):
                         target_column = disabled_col
                     else:
                         logger.warning(f"⚠️ Unknown status: {status} - skipping")
-                        clear_taken_entry(account_id)
+                        processed[account_id] = item.get("added_at")
                         continue
 
-                    # ✅ الخطوة 5: التحديث في Sheet
-                    success, message = update_sheet_cell(
-                        sheets_api, row_number, target_column, converted_value
-                    )
-
-                    if success:
-                        logger.info(
-                            f"✅ Updated {target_column}{row_number} = '{converted_value}' "
-                            f"for {email} ({status})"
-                        )
-                    else:
-                        logger.error(
-                            f"❌ Failed to update {target_column}{row_number}: {message}"
-                        )
+                    # ✅ الخطوة 5: تجهيز التحديث (بيتبعت مع الدفعة كلها)
+                    cell = f"{target_column}{row_number}"
+                    updates.append((cell, converted_value))
+                    updated_items.append((cell, email, status))
 
                     # ✅ الخطوة 6: مسح من Queue (نجح أو فشل - بدون retry)
-                    clear_taken_entry(account_id)
+                    processed[account_id] = item.get("added_at")
 
                 except Exception as e:
                     logger.exception(f"❌ Error processing item: {e}")
                     # مسح حتى لو حصل خطأ (بدون retry)
-                    clear_taken_entry(item.get("id", ""))
+                    processed[item.get("id", "")] = item.get("added_at")
+
+            # ✅ التحديث في Sheet (طلب واحد لكل الخلايا)
+            if updates:
+                success, message = await sheets_api.call(
+                    batch_update_sheet_cells, sheets_api, updates
+                )
+
+                for (cell, email, status), (_, value) in zip(updated_items, updates):
+                    if success:
+                        logger.info(
+                            f"✅ Updated {cell} = '{value}' for {email} ({status})"
+                        )
+                    else:
+                        logger.error(f"❌ Failed to update {cell}: {message}")
+
+            await asyncio.to_thread(clear_taken_entries, processed)
 
             # انتظار عشوائي قبل الدورة التالية
             interval = random.uniform(interval_min, interval_max)
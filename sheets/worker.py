@@ -9,18 +9,23 @@ Background worker مع 3 timers منفصلة (pending, retry, taken)
 import asyncio
 import logging
 import random
-from typing import Dict
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
 
 from .google_api import GoogleSheetsAPI
-from .id_history import add_ids_to_history
+from .id_history import add_ids_to_history, history_flush_worker
 from .logger import WeeklyLogger
 from .queue_manager import (
     clear_batch,
     get_pending_batch,
     get_retry_batch,
-    move_to_failed,
-    move_to_retry,
-    save_queue,
+    move_many_to_failed,
+    move_many_to_retry,
+    queue_may_have_items,
+    requeue_batch,
+    set_fsync_queues,
+    watch_pending,
 )
 
 # 🆕 استيراد آمن للـ Taken Worker
@@ -34,69 +39,224 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# 🧠 آخر (email, id) اتضافوا للشيت في الجلسة دي (LRU)
+# نفس الإيميل بنفس الـ ID لو اتحط في pending/retry تاني مش بيتكتب صف جديد
+APPENDED_CACHE_SIZE = 10000
+_recently_appended: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
 
-async def pending_worker(
-    config: Dict, sheets_api: GoogleSheetsAPI, weekly_log: WeeklyLogger
-):
+# IDs مش حقيقية → مش بتتسجل في id_history
+_INVALID_IDS = frozenset({"N/A", ""})
+
+
+def _entry_key(item: Dict) -> Tuple[str, str]:
+    return item["email"], item.get("id", "")
+
+
+def _split_batch(batch: List[Dict]) -> Tuple[List[str], List[Dict], List[str]]:
     """
-    Timer 1: معالجة pending.json (1-10 ثواني)
+    لفة واحدة على الدفعة بتطلع كل اللي الـ worker محتاجه
+
+    Returns:
+        (emails, unique, ids_to_record)
+        - emails: كل إيميلات الدفعة (بالمكرر) - للمسح من الـ queue
+        - unique: من غير تكرار (نفس (email, id) في الدفعة أو اتضاف قبل كده في
+          الجلسة) - دول بس اللي بيتبعتوا للشيت
+        - ids_to_record: IDs صالحة من unique من غير تكرار - للـ id_history
     """
-    queue_config = config.get("queue", {})
-    min_interval = queue_config.get("pending_interval_min", 1)
-    max_interval = queue_config.get("pending_interval_max", 10)
-    max_retries = queue_config.get("max_retries", 50)
+    emails = []
+    unique = []
+    ids_to_record = []
+    seen = set()
+    seen_ids = set()
 
-    logger.info(f"🔄 Pending worker started (interval: {min_interval}-{max_interval}s)")
+    for item in batch:
+        email = item["email"]
+        item_id = item.get("id", "")
+        emails.append(email)
 
-    while True:
-        try:
-            batch = get_pending_batch()
+        key = (email, item_id)
+        if key in seen or key in _recently_appended:
+            continue
+        seen.add(key)
+        unique.append(item)
 
-            if batch:
-                emails_data = [
-                    {"email": item["email"], "id": item.get("id", "")} for item in batch
-                ]
+        if item_id and item_id not in _INVALID_IDS and item_id not in seen_ids:
+            seen_ids.add(item_id)
+            ids_to_record.append(item_id)
 
-                emails = [item["email"] for item in batch]
+    return emails, unique, ids_to_record
 
-                logger.info(f"📤 Processing {len(emails)} emails from pending queue")
 
-                success, message = sheets_api.append_emails(emails_data)
+def _remember_appended(items: List[Dict]):
+    """تسجيل اللي اتضاف في الـ LRU (الأقدم بيخرج الأول)"""
+    for item in items:
+        key = _entry_key(item)
+        _recently_appended[key] = None
+        _recently_appended.move_to_end(key)
 
-                if success:
-                    ids_to_record = [
-                        item.get("id", "")
-                        for item in batch
-                        if item.get("id") and item.get("id") not in ["N/A", "", None]
-                    ]
+    while len(_recently_appended) > APPENDED_CACHE_SIZE:
+        _recently_appended.popitem(last=False)
 
-                    if ids_to_record:
-                        add_ids_to_history(ids_to_record)
 
-                    clear_batch("pending.json", emails)
+async def _append_unique(
+    batch: List[Dict], unique: List[Dict], sheets_api: GoogleSheetsAPI
+) -> Tuple[bool, str]:
+    """
+    إرسال الإيميلات الفريدة بس من الدفعة (unique من _split_batch)
 
-                    log_msg = f"✅ Added {len(emails)} emails to Sheet"
-                    logger.info(log_msg)
-                    weekly_log.write(log_msg)
+    Returns:
+        (success, message)
+    """
+    skipped = len(batch) - len(unique)
+    if skipped:
+        logger.info(f"♻️ Skipped {skipped} duplicate emails")
 
-                else:
-                    logger.warning(f"⚠️ Failed to add emails: {message}")
+    if not unique:
+        return True, "Duplicates only"
 
-                    for item in batch:
-                        attempts = item.get("attempts", 0)
+    # عناصر الـ queue بتتبعت زي ما هي (append_emails بيقرا email/id بس)
+    # بدل dict جديد لكل إيميل في كل دفعة
+    success, message = await sheets_api.append_emails(unique)
 
-                        if attempts < max_retries:
-                            move_to_retry(item)
-                        else:
-                            move_to_failed(item)
-                            log_msg = f"❌ {item['email']} moved to failed (max retries: {max_retries})"
-                            logger.warning(log_msg)
-                            weekly_log.write(log_msg)
+    if success:
+        _remember_appended(unique)
 
-                    clear_batch("pending.json", emails)
+    return success, message
 
-            interval = random.uniform(min_interval, max_interval)
-            await asyncio.sleep(interval)
+
+async def _process_pending_batch(
+    batch: List[Dict],
+    sheets_api: GoogleSheetsAPI,
+    weekly_log: WeeklyLogger,
+    max_retries: int,
+):
+    """
+    إرسال دفعة واحدة من pending للشيت + مسحها أو نقلها لـ retry/failed
+    (كل دفعة شريحة منفصلة من pending - مفيش إيميل بيتبعت مرتين)
+    """
+    # كل إيميلات الدفعة (بالمكرر) بتتمسح من pending في الآخر
+    emails, unique, ids_to_record = _split_batch(batch)
+
+    logger.info(f"📤 Processing {len(emails)} emails from pending queue")
+
+    success, message = await _append_unique(batch, unique, sheets_api)
+
+    if success:
+        if ids_to_record:
+            add_ids_to_history(ids_to_record)
+
+        await asyncio.to_thread(clear_batch, "pending.json", emails)
+
+        log_msg = f"✅ Added {len(unique)} emails to Sheet"
+        logger.info(log_msg)
+        weekly_log.write(log_msg)
+
+    else:
+        logger.warning(f"⚠️ Failed to add emails: {message}")
+
+        to_retry = []
+        to_failed = []
+
+        # المكرر مش محتاج retry (نسخته الأولى هي اللي بتتنقل)
+        for item in unique:
+            attempts = item.get("attempts", 0)
+
+            if attempts < max_retries:
+                to_retry.append(item)
+            else:
+                to_failed.append(item)
+                log_msg = f"❌ {item['email']} moved to failed (max retries: {max_retries})"
+                logger.warning(log_msg)
+                weekly_log.write(log_msg)
+
+        # قراءة + حفظ واحد لكل ملف للدفعة كلها
+        await asyncio.to_thread(move_many_to_retry, to_retry)
+        await asyncio.to_thread(move_many_to_failed, to_failed)
+
+        await asyncio.to_thread(clear_batch, "pending.json", emails)
+
+
+async def pending_worker(
+    config: Dict, sheets_api: GoogleSheetsAPI, weekly_log: WeeklyLogger
+):
+    """
+    Timer 1: معالجة pending.json (على طول مع كل إضافة - أو كل 10 ثواني بالكتير)
+    """
+    queue_config = config.get("queue", {})
+    max_interval = queue_config.get("pending_interval_max", 10)
+    max_retries = queue_config.get("max_retries", 50)
+    # 📦 أقصى عدد صفوف في نداء append واحد (الباقي للدورة الجاية)
+    batch_max_rows = queue_config.get("batch_max_rows", 500)
+    # ⏱️ أقل وقت بين نداءين append (الدفعات الصغيرة بتستنى وتتجمع مع اللي بعدها)
+    flush_interval = queue_config.get("flush_interval_s", 2.0)
+    # 🚦 أقصى عدد دفعات بتتبعت مع بعض لما pending يكون أكبر من دفعة واحدة
+    concurrency = max(1, queue_config.get("concurrency", 4))
+    last_flush = 0.0
+
+    # 🔔 أي إضافة لـ pending بتصحّي الـ worker على طول
+    # (max_interval بيفضل حد أقصى للانتظار عشان أي ملف اتعدل من بره)
+    pending_event = watch_pending()
+
+    logger.info(
+        f"🔄 Pending worker started (event-driven, max wait: {max_interval}s, "
+        f"concurrency: {concurrency})"
+    )
+
+    while True:
+        try:
+            # أي إضافة أثناء المعالجة هتعمل set تاني → مش هتضيع
+            pending_event.clear()
+            wait_timeout = max_interval
+
+            # 💤 فاضي ومفيش حاجة اتكتبت → مفيش thread ولا قراءة، نستنى على طول
+            if not queue_may_have_items("pending.json"):
+                try:
+                    await asyncio.wait_for(pending_event.wait(), wait_timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # 🧵 كل عمليات ملفات الـ queue في thread - الـ event loop (Web API
+            # والبوت) ميقفش ورا قراءة/fsync الملفات
+            pending = await asyncio.to_thread(get_pending_batch)
+
+            # الإضافات بتتجمع في pending طول فترة الانتظار، وكل دورة بتتقسم
+            # لشرائح منفصلة (كل واحدة لحد batch_max_rows) بتتبعت مع بعض
+            limit = batch_max_rows * concurrency
+            batches = [
+                pending[i : i + batch_max_rows]
+                for i in range(0, min(len(pending), limit), batch_max_rows)
+            ]
+
+            # فيه باقي بعد الدفعات دي → الدورة الجاية بعد flush_interval بس
+            if len(pending) > limit:
+                wait_timeout = flush_interval
+
+            # دفعة واحدة مش مليانة ولسه بدري → تفضل في pending وتتبعت مع الجاي
+            if (
+                len(batches) == 1
+                and len(batches[0]) < batch_max_rows
+                and time.monotonic() - last_flush < flush_interval
+            ):
+                batches = []
+                # نصحى تاني أول ما الـ flush_interval يخلص
+                wait_timeout = flush_interval - (time.monotonic() - last_flush)
+
+            if batches:
+                last_flush = time.monotonic()
+                await asyncio.gather(
+                    *(
+                        _process_pending_batch(
+                            batch, sheets_api, weekly_log, max_retries
+                        )
+                        for batch in batches
+                    )
+                )
+
+            try:
+                await asyncio.wait_for(pending_event.wait(), wait_timeout)
+            except asyncio.TimeoutError:
+                pass
 
         except Exception as e:
             logger.exception(f"❌ Error in pending worker: {e}")
@@ -118,32 +278,29 @@ async def retry_worker(
 
     while True:
         try:
-            batch = get_retry_batch()
+            interval = random.uniform(min_interval, max_interval)
 
-            if batch:
-                emails_data = [
-                    {"email": item["email"], "id": item.get("id", "")} for item in batch
-                ]
+            # 💤 فاضي ومفيش حاجة اتكتبت → مفيش thread ولا قراءة
+            if not queue_may_have_items("retry.json"):
+                await asyncio.sleep(interval)
+                continue
 
-                emails = [item["email"] for item in batch]
+            batch = await asyncio.to_thread(get_retry_batch)
+
+            if batch:
+                emails, unique, ids_to_record = _split_batch(batch)
 
                 logger.info(f"🔁 Retrying {len(emails)} emails from retry queue")
 
-                success, message = sheets_api.append_emails(emails_data)
+                success, message = await _append_unique(batch, unique, sheets_api)
 
                 if success:
-                    ids_to_record = [
-                        item.get("id", "")
-                        for item in batch
-                        if item.get("id") and item.get("id") not in ["N/A", "", None]
-                    ]
-
                     if ids_to_record:
                         add_ids_to_history(ids_to_record)
 
-                    clear_batch("retry.json", emails)
+                    await asyncio.to_thread(clear_batch, "retry.json", emails)
 
-                    log_msg = f"✅ Added {len(emails)} emails to Sheet (retry)"
+                    log_msg = f"✅ Added {len(unique)} emails to Sheet (retry)"
                     logger.info(log_msg)
                     weekly_log.write(log_msg)
 
@@ -151,28 +308,30 @@ async def retry_worker(
                     logger.warning(f"⚠️ Retry failed: {message}")
 
                     updated_batch = []
-                    failed_emails = []
+                    failed_items = []
 
-                    for item in batch:
+                    for item in unique:
                         attempts = item.get("attempts", 0) + 1
                         item["attempts"] = attempts
 
                         if attempts < max_retries:
                             updated_batch.append(item)
                         else:
-                            move_to_failed(item)
-                            failed_emails.append(item["email"])
+                            failed_items.append(item)
                             log_msg = f"❌ {item['email']} moved to failed (max retries: {max_retries})"
                             logger.warning(log_msg)
                             weekly_log.write(log_msg)
 
-                    save_queue("retry.json", {"emails": updated_batch})
+                    await asyncio.to_thread(move_many_to_failed, failed_items)
+                    # مسح الدفعة + رجوع النسخ المحدثة لآخر retry في كتابة واحدة
+                    await asyncio.to_thread(
+                        requeue_batch, "retry.json", emails, updated_batch
+                    )
 
-                    if failed_emails:
-                        log_msg = f"❌ {len(failed_emails)} emails moved to failed"
+                    if failed_items:
+                        log_msg = f"❌ {len(failed_items)} emails moved to failed"
                         weekly_log.write(log_msg)
 
-            interval = random.uniform(min_interval, max_interval)
             await asyncio.sleep(interval)
 
         except Exception as e:
@@ -197,15 +356,28 @@ async def start_sheet_worker(config: Dict):
             logger.error("❌ Google Sheet ID not configured!")
             return
 
-        sheets_api = GoogleSheetsAPI(credentials_file, spreadsheet_id, sheet_name)
+        # 🚦 نفس حد التوازي بتاع الـ pending worker (+1 للـ retry/taken)
+        concurrency = max(1, config.get("queue", {}).get("concurrency", 4))
+        sheets_api = GoogleSheetsAPI(
+            credentials_file,
+            spreadsheet_id,
+            sheet_name,
+            max_concurrency=concurrency + 1,
+        )
 
         log_dir = config.get("queue", {}).get("log_dir", "logs")
         weekly_log = WeeklyLogger(log_dir)
 
+        # 💽 الـ queues اللي محتاجة fsync مع إعادة الكتابة (افتراضياً failed بس)
+        fsync_queues = config.get("queue", {}).get("fsync_queues")
+        if fsync_queues is not None:
+            set_fsync_queues(fsync_queues)
+
         # ✅ تحديد Workers المتاحة
         workers = [
             pending_worker(config, sheets_api, weekly_log),
             retry_worker(config, sheets_api, weekly_log),
+            history_flush_worker(),
         ]
 
         # ✅ إضافة Taken Worker إذا كان متوفر
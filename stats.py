@@ -5,12 +5,28 @@
 مدير الإحصائيات المركزي - ملف منفصل لتجنب Circular Import
 """
 
+import asyncio
+import atexit
 import json
-from dataclasses import asdict, dataclass
+import os
+import threading
+import time
+from dataclasses import dataclass, fields
 from datetime import datetime
+from operator import attrgetter
 from pathlib import Path
 
+# ⚡ orjson أسرع بكتير في القراءة والكتابة - اختياري
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 STATS_FILE = "request_stats.json"
+STATS_FLUSH_INTERVAL = 5.0  # ⏱️ كل قد إيه نكتب العدادات المتغيرة على الديسك
+
+# 🔒 save بيتنادى من الـ flush worker (thread) ومن الـ shutdown - كتابة واحدة في المرة
+_save_lock = threading.Lock()
 
 
 @dataclass
@@ -27,24 +43,93 @@ class RequestStats:
     adaptive_adjustments: int = 0
     last_reset: str = datetime.now().isoformat()
 
-    def save(self):
+    def __post_init__(self):
+        # ⏱️ وقت الـ reset يتحلل مرة واحدة (مش fields - مش بيتحفظوا في الملف)
+        # reset_monotonic بيسمح بحساب المدة بطرح float بس في /stats
         try:
-            with open(STATS_FILE, "w") as f:
-                json.dump(asdict(self), f, indent=2)
-        except Exception as e:
-            print(f"❌ Error saving stats: {e}")
+            self.reset_datetime = datetime.fromisoformat(self.last_reset)
+        except (TypeError, ValueError):
+            self.reset_datetime = datetime.now()
+        age = max(time.time() - self.reset_datetime.timestamp(), 0.0)
+        self.reset_monotonic = time.monotonic() - age
+        # 📸 آخر نسخة اتكتبت على الديسك - لو العدادات زي ما هي مفيش كتابة
+        self._saved_snapshot = self._snapshot()
+
+    def _snapshot(self) -> tuple:
+        """قيم الـ fields كـ tuple (attrgetter - astuple بطيء وبيعمل deepcopy)"""
+        return _get_field_values(self)
+
+    def _to_dict(self) -> dict:
+        """نفس شكل asdict بالظبط (نفس الـ keys والترتيب) للحفظ في الملف"""
+        return dict(zip(_FIELD_NAMES, self._snapshot()))
+
+    @property
+    def dirty(self) -> bool:
+        """فيه عدادات اتغيرت من آخر حفظ؟"""
+        return self._snapshot() != self._saved_snapshot
+
+    def save(self):
+        snapshot = self._snapshot()
+        data = self._to_dict()
+        # ملف مؤقت + os.replace: crash وسط الكتابة ما يسيبش JSON مقطوع
+        # (load كان هيرجع كل العدادات لصفر)
+        tmp_file = f"{STATS_FILE}.tmp"
+        with _save_lock:
+            try:
+                if orjson is not None:
+                    with open(tmp_file, "wb") as f:
+                        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+                else:
+                    with open(tmp_file, "w") as f:
+                        json.dump(data, f, indent=2)
+                os.replace(tmp_file, STATS_FILE)
+                self._saved_snapshot = snapshot
+            except Exception as e:
+                print(f"❌ Error saving stats: {e}")
+
+    def flush(self):
+        """حفظ بس لو فيه تغيير (write-back)"""
+        if self.dirty:
+            self.save()
+
+    async def flush_async(self):
+        """زي flush بس في thread منفصل"""
+        if self.dirty:
+            await asyncio.to_thread(self.save)
 
     @classmethod
     def load(cls):
         if Path(STATS_FILE).exists():
             try:
-                with open(STATS_FILE, "r") as f:
-                    data = json.load(f)
+                if orjson is not None:
+                    with open(STATS_FILE, "rb") as f:
+                        data = orjson.loads(f.read())
+                else:
+                    with open(STATS_FILE, "r") as f:
+                        data = json.load(f)
                 return cls(**data)
             except:
                 pass
         return cls()
 
 
+# 📋 أسماء الـ fields مرة واحدة (مصدر واحد لـ _snapshot و _to_dict)
+_FIELD_NAMES = tuple(f.name for f in fields(RequestStats))
+_get_field_values = attrgetter(*_FIELD_NAMES)
+
+
 # Global stats instance
 stats = RequestStats.load()
+# 🧯 آخر حفظ عند الخروج - لو حاجة اتغيرت بعد آخر flush
+atexit.register(stats.flush)
+
+
+async def stats_flush_worker(interval: float = STATS_FLUSH_INTERVAL):
+    """
+    💾 Write-back للإحصائيات
+    العدادات بتتغير في الذاكرة بس، والـ worker ده بيكتبها كل interval ثانية
+    لو اتغيرت - بدل ما نستنى الـ shutdown ونخسرها لو البوت وقع
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await stats.flush_async()
@@ -5,88 +5,145 @@
 Endpoints للـ Web API
 """
 
+import asyncio
+import json
 import logging
+from dataclasses import dataclass
+from typing import Any, Dict
+
 from aiohttp import web
 from core import add_to_pending_queue
 
-logger = logging.getLogger(__name__)
+# ⚡ orjson أسرع في فك الـ body - اختياري
+try:
+    import orjson
 
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
 
-async def register_handler(request: web.Request):
-    """
-    POST /api/register
-    استقبال طلب إضافة حساب جديد
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
 
-    Request Body (JSON):
-    {
-        "email": "user@example.com",
-        "password": "password123",
-        "backup_codes": "12345678,87654321",  // اختياري
-        "amount_take": "100",                  // اختياري
-        "amount_keep": "50"                    // اختياري
-    }
 
-    Response (JSON):
-    {
-        "status": "success",
-        "message": "Account added successfully",
-        "email": "user@example.com"
-    }
-    """
-    try:
-        # قراءة البيانات
-        data = await request.json()
-
-        email = data.get("email", "").strip().lower()
-        password = data.get("password", "").strip()
-        backup_codes = data.get("backup_codes", "")
-        amount_take = data.get("amount_take", "")
-        amount_keep = data.get("amount_keep", "")
-
-        # Validation
-        if not email or not password:
-            return web.json_response({
-                "status": "error",
-                "message": "Email and password are required"
-            }, status=400)
-
-        # الحصول على api_manager من الـ app
-        api_manager = request.app["api_manager"]
-
-        # إضافة الحساب
-        success, message = await api_manager.add_sender(
-            email=email,
-            password=password,
-            backup_codes=backup_codes,
-            amount_take=amount_take,
-            amount_keep=amount_keep
-        )
+logger = logging.getLogger(__name__)
 
-        if success:
-            # 🆕 إضافة للـ queue
-            add_to_pending_queue(email)
+# 💓 رد /health ثابت → بيتعمل bytes مرة واحدة بس (مش serialize مع كل probe)
+_HEALTH_BODY = _json_dumps({
+    "status": "ok",
+    "service": "Smart Sender API",
+    "version": "1.0.0"
+})
+
+
+@dataclass
+class RegisterRequest:
+    """بيانات /api/register بعد التنضيف (strip/lower مرة واحدة)"""
+
+    email: str
+    password: str
+    backup_codes: Any = ""
+    amount_take: Any = ""
+    amount_keep: Any = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RegisterRequest":
+        return cls(
+            email=str(data.get("email") or "").strip().lower(),
+            password=str(data.get("password") or "").strip(),
+            backup_codes=data.get("backup_codes", ""),
+            amount_take=data.get("amount_take", ""),
+            amount_keep=data.get("amount_keep", ""),
+        )
 
-            logger.info(f"✅ Account added via API: {email}")
 
-            return web.json_response({
-                "status": "success",
-                "message": "Account added successfully and queued for Sheet sync",
-                "email": email
-            }, status=200)
-        else:
-            logger.warning(f"⚠️ Failed to add account via API: {email} - {message}")
+def make_register_handler(api_manager):
+    """
+    بناء handler الـ /api/register مربوط بالـ api_manager
+    (closure بدل request.app["api_manager"] مع كل طلب)
+    """
 
+    async def register_handler(request: web.Request):
+        """
+        POST /api/register
+        استقبال طلب إضافة حساب جديد
+
+        Request Body (JSON):
+        {
+            "email": "user@example.com",
+            "password": "password123",
+            "backup_codes": "12345678,87654321",  // اختياري
+            "amount_take": "100",                  // اختياري
+            "amount_keep": "50"                    // اختياري
+        }
+
+        Response (JSON):
+        {
+            "status": "success",
+            "message": "Account added successfully",
+            "email": "user@example.com"
+        }
+        """
+        try:
+            # قراءة البيانات (bytes → orjson على طول، من غير decode لـ str الأول)
+            try:
+                data = _json_loads(await request.read())
+            except ValueError:
+                data = None
+
+            if not isinstance(data, dict):
+                return web.json_response({
+                    "status": "error",
+                    "message": "Request body must be a JSON object"
+                }, status=400)
+
+            req = RegisterRequest.from_dict(data)
+            email = req.email
+
+            # Validation
+            if not email or not req.password:
+                return web.json_response({
+                    "status": "error",
+                    "message": "Email and password are required"
+                }, status=400)
+
+            # إضافة الحساب
+            success, message = await api_manager.add_sender(
+                email=email,
+                password=req.password,
+                backup_codes=req.backup_codes,
+                amount_take=req.amount_take,
+                amount_keep=req.amount_keep
+            )
+
+            if success:
+                # 🆕 إضافة للـ queue
+                await asyncio.to_thread(add_to_pending_queue, email)
+
+                logger.info(f"✅ Account added via API: {email}")
+
+                return web.json_response({
+                    "status": "success",
+                    "message": "Account added successfully and queued for Sheet sync",
+                    "email": email
+                }, status=200)
+            else:
+                logger.warning(f"⚠️ Failed to add account via API: {email} - {message}")
+
+                return web.json_response({
+                    "status": "error",
+                    "message": message
+                }, status=400)
+
+        except Exception as e:
+            logger.exception(f"❌ API Error: {e}")
             return web.json_response({
                 "status": "error",
-                "message": message
-            }, status=400)
+                "message": str(e)
+            }, status=500)
 
-    except Exception as e:
-        logger.exception(f"❌ API Error: {e}")
-        return web.json_response({
-            "status": "error",
-            "message": str(e)
-        }, status=500)
+    return register_handler
 
 
 async def health_handler(request: web.Request):
@@ -100,18 +157,16 @@ async def health_handler(request: web.Request):
         "service": "Smart Sender API"
     }
     """
-    return web.json_response({
-        "status": "ok",
-        "service": "Smart Sender API",
-        "version": "1.0.0"
-    })
+    return web.Response(body=_HEALTH_BODY, content_type="application/json")
 
 
 def setup_routes(app: web.Application):
     """
     إعداد جميع الـ routes
     """
-    app.router.add_post("/api/register", register_handler)
+    app.router.add_post(
+        "/api/register", make_register_handler(app["api_manager"])
+    )
     app.router.add_get("/health", health_handler)
 
     logger.info("✅ API routes configured")